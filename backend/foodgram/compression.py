@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+INCOMPRESSIBLE_TYPES = ('image/', 'application/pdf', 'application/zip')
+
+
+def brotli_string(content):
+    return brotli.compress(content, quality=settings.BROTLI_QUALITY)
+
+
+def brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+    for chunk in sequence:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+# Supported codings in order of preference.
+ENCODINGS = {
+    'gzip': (compress_string, compress_sequence),
+}
+if brotli is not None:
+    ENCODINGS = {'br': (brotli_string, brotli_sequence), **ENCODINGS}
+
+
+def parse_quality(params):
+    for param in params.split(';'):
+        name, _, value = param.strip().partition('=')
+        if name == 'q':
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def choose_encoding(accept_encoding):
+    """Picks the supported coding the client accepts with the highest q.
+
+    Ties are resolved by ENCODINGS order, so brotli wins over gzip.
+    """
+    qualities = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding.strip() in ENCODINGS:
+            qualities[coding.strip()] = parse_quality(params)
+    accepted = [coding for coding in ENCODINGS if qualities.get(coding, 0)]
+    if not accepted:
+        return None
+    return max(accepted, key=lambda coding: qualities[coding])
+
+
+class CompressionMiddleware:
+    """Compresses responses with brotli or gzip as negotiated.
+
+    Brotli needs the brotli package and falls back to gzip without it.
+    Responses shorter than COMPRESSION_MIN_SIZE bytes are not worth the
+    CPU and are sent as they are, as is content that is compressed
+    already. Streaming responses are compressed chunk by chunk.
+
+    Compressing a secret next to text the attacker controls lets them
+    guess the secret from the response size (BREACH). Paths starting with
+    one of COMPRESSION_EXCLUDE_PATHS, by default the token endpoints and
+    the admin with its CSRF tokens, are therefore never compressed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.path.startswith(settings.COMPRESSION_EXCLUDE_PATHS):
+            return response
+        content_type = response.get('Content-Type', '')
+        if (response.has_header('Content-Encoding')
+                or content_type.startswith(INCOMPRESSIBLE_TYPES)
+                or not response.streaming
+                and len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding', ))
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+        compress, compress_stream = ENCODINGS[encoding]
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content
+            )
+            del response['Content-Length']
+        else:
+            content = compress(response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+        # The body differs from the uncompressed one, so a strong ETag
+        # would be wrong; the views compare ETags weakly anyway.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,140 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework import permissions
+
+PIN_KEY = 'db_pinned:{user_id}'
+
+
+class RoutingState(threading.local):
+    replica_reads = False
+    wrote = False
+
+
+state = RoutingState()
+
+
+def is_pinned(user):
+    return user.is_authenticated and bool(
+        cache.get(PIN_KEY.format(user_id=user.pk))
+    )
+
+
+class ReplicaRouter:
+    """Sends reads of opted-in views to a random DATABASE_REPLICAS alias.
+
+    Reads go to a replica only while a ReplicaReadMixin view handles a safe
+    request and nothing has been written during the request yet; writes
+    always go to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if state.replica_reads and not state.wrote:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """Lets safe requests of the viewset read from the replicas.
+
+    ``replica_actions`` limits this to the listed actions. Users who wrote
+    anything during the last REPLICA_PIN_SECONDS read from the default
+    database, so they always see their own changes.
+    """
+    replica_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (request.method in permissions.SAFE_METHODS
+                and (self.replica_actions is None
+                     or self.action in self.replica_actions)
+                and not is_pinned(request.user)):
+            state.replica_reads = True
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        state.replica_reads = False
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaRoutingMiddleware:
+    """Resets the routing state and pins users who wrote to the default.
+
+    DRF stores the authenticated user on the Django request, so token
+    authenticated users are seen here after the view has run. Pins live in
+    the cache, which must be shared by all workers: a pin set by one worker
+    has to be seen by the worker serving the user's next read.
+    """
+
+    def __init__(self, get_response):
+        if not settings.CACHE_SHARED:
+            raise ImproperlyConfigured(
+                'DB_REPLICA_HOSTS requires a cache shared by all workers, '
+                'set CACHE_BACKEND to e.g. memcached.'
+            )
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state.replica_reads = state.wrote = False
+        try:
+            return self.get_response(request)
+        finally:
+            user = getattr(request, 'user', None)
+            if state.wrote and user is not None and user.is_authenticated:
+                cache.set(
+                    PIN_KEY.format(user_id=user.pk),
+                    True,
+                    settings.REPLICA_PIN_SECONDS
+                )
+            state.replica_reads = state.wrote = False
+
+
+class ConnectionHealthCheckMiddleware:
+    """Closes persistent connections that became unusable between requests.
+
+    With CONN_MAX_AGE a connection may outlive a database restart or a
+    failover; checking it before the request lets Django reconnect instead
+    of failing the request on the first query. Only connections idle for
+    DB_CONN_HEALTH_CHECK_IDLE seconds or more are checked, so busy workers
+    do not pay a round trip per request; broken and expired connections
+    are still closed by Django at the end of each request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.last_used = threading.local()
+
+    def is_idle(self, connection, now):
+        last_used = getattr(self.last_used, 'times', {}).get(connection.alias)
+        return (last_used is None
+                or now - last_used >= settings.DB_CONN_HEALTH_CHECK_IDLE)
+
+    def __call__(self, request):
+        now = time.monotonic()
+        for connection in connections.all():
+            if (connection.connection is not None
+                    and self.is_idle(connection, now)
+                    and not connection.is_usable()):
+                connection.close()
+        try:
+            return self.get_response(request)
+        finally:
+            now = time.monotonic()
+            self.last_used.times = {
+                connection.alias: now for connection in connections.all()
+                if connection.connection is not None
+            }
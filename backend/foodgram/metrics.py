@@ -0,0 +1,303 @@
+import bisect
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SLOT_KEY = 'request_metrics:slot:{slot}'
+METRICS_TIMEOUT = 60 * 60 * 24
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    """Query log and timings of a single request.
+
+    Instances are installed as execute wrappers on every database
+    connection, so each executed statement is counted and timed.
+    """
+
+    def __init__(self):
+        self.endpoint = None
+        self.queries = []
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.db_time += duration
+            self.queries.append((sql, duration))
+
+    def server_timing(self):
+        return (
+            f'db;desc="{len(self.queries)} queries";'
+            f'dur={self.db_time * 1000:.1f}, '
+            f'serializer;dur={self.serializer_time * 1000:.1f}, '
+            f'total;dur={self.total_time * 1000:.1f}'
+        )
+
+
+@contextmanager
+def serializer_timer():
+    """Adds the time of the outermost serializer call to the request."""
+    metrics = getattr(_local, 'current', None)
+    if metrics is None or metrics.serializer_depth:
+        yield
+        return
+    metrics.serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_depth -= 1
+        metrics.serializer_time += time.perf_counter() - start
+
+
+class TimedSerializerMixin:
+    """Reports the serializer's to_representation time to the metrics."""
+
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
+
+
+def new_stats():
+    return {
+        'count': 0,
+        'over_budget': 0,
+        'queries': 0,
+        'max_queries': 0,
+        'total_ms': 0.0,
+        'max_ms': 0.0,
+        'db_ms': 0.0,
+        'serializer_ms': 0.0,
+        'latency_histogram': [0] * (len(LATENCY_BUCKETS) + 1),
+        'query_histogram': [0] * (len(QUERY_BUCKETS) + 1),
+    }
+
+
+def merge_stats(target, source):
+    for key, value in source.items():
+        if key.startswith('max_'):
+            target[key] = max(target[key], value)
+        elif key.endswith('_histogram'):
+            target[key] = [a + b for a, b in zip(target[key], value)]
+        else:
+            target[key] += value
+    return target
+
+
+def percentile(histogram, buckets, maximum, fraction):
+    """Estimates a percentile as the upper bound of its histogram bucket."""
+    rank = fraction * sum(histogram)
+    seen = 0
+    for bound, count in zip(buckets, histogram):
+        seen += count
+        if seen >= rank:
+            return min(bound, maximum)
+    return maximum
+
+
+class MetricsRegistry:
+    """In-process aggregate of request metrics per view action.
+
+    Every worker keeps its own histograms and publishes a snapshot to the
+    Django cache at most once per REQUEST_METRICS_PUBLISH_INTERVAL, so the
+    report can merge the numbers of all workers. Each worker claims one of
+    REQUEST_METRICS_SLOTS keys with an atomic cache.add, so publishing
+    never rewrites a key shared with other workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._published = 0.0
+        self._slot = None
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+
+    def record(self, metrics, budget):
+        total_ms = metrics.total_time * 1000
+        queries = len(metrics.queries)
+        with self._lock:
+            stats = self._stats.setdefault(metrics.endpoint, new_stats())
+            stats['count'] += 1
+            stats['over_budget'] += queries > budget
+            stats['queries'] += queries
+            stats['max_queries'] = max(stats['max_queries'], queries)
+            stats['total_ms'] += total_ms
+            stats['max_ms'] = max(stats['max_ms'], total_ms)
+            stats['db_ms'] += metrics.db_time * 1000
+            stats['serializer_ms'] += metrics.serializer_time * 1000
+            stats['latency_histogram'][
+                bisect.bisect_left(LATENCY_BUCKETS, total_ms)
+            ] += 1
+            stats['query_histogram'][
+                bisect.bisect_left(QUERY_BUCKETS, queries)
+            ] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: merge_stats(new_stats(), stats)
+                for endpoint, stats in self._stats.items()
+            }
+
+    def claim_slot(self, value):
+        """Stores the value in the first free slot and returns its key."""
+        for slot in range(settings.REQUEST_METRICS_SLOTS):
+            key = SLOT_KEY.format(slot=slot)
+            if cache.add(key, value, METRICS_TIMEOUT):
+                return key
+        logger.warning('No free request metrics slot for %s', self.worker)
+        return None
+
+    def publish(self, force=False):
+        now = time.monotonic()
+        interval = settings.REQUEST_METRICS_PUBLISH_INTERVAL
+        if not force and now - self._published < interval:
+            return
+        self._published = now
+        snapshot = self.snapshot()
+        if not snapshot:
+            return
+        value = (self.worker, snapshot)
+        # A slot that expired may have been claimed by another worker.
+        owner = cache.get(self._slot) if self._slot else None
+        if owner is not None and owner[0] == self.worker:
+            cache.set(self._slot, value, METRICS_TIMEOUT)
+        else:
+            self._slot = self.claim_slot(value)
+
+
+registry = MetricsRegistry()
+
+
+def collect():
+    """Merges the published snapshots of all workers."""
+    registry.publish(force=True)
+    merged = {}
+    snapshots = cache.get_many([
+        SLOT_KEY.format(slot=slot)
+        for slot in range(settings.REQUEST_METRICS_SLOTS)
+    ])
+    for _, snapshot in snapshots.values():
+        for endpoint, stats in snapshot.items():
+            merge_stats(merged.setdefault(endpoint, new_stats()), stats)
+    return merged
+
+
+def get_report(stats):
+    """Summarises merged stats, endpoints issuing the most SQL first."""
+    rows = []
+    for endpoint, item in stats.items():
+        count = item['count']
+        row = {
+            'endpoint': endpoint,
+            'count': count,
+            'over_budget': item['over_budget'],
+            'avg_queries': round(item['queries'] / count, 1),
+            'max_queries': item['max_queries'],
+            'avg_ms': round(item['total_ms'] / count, 1),
+            'avg_db_ms': round(item['db_ms'] / count, 1),
+            'avg_serializer_ms': round(item['serializer_ms'] / count, 1),
+        }
+        for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            row[f'{name}_ms'] = round(percentile(
+                item['latency_histogram'],
+                LATENCY_BUCKETS,
+                item['max_ms'],
+                fraction
+            ), 1)
+        rows.append(row)
+    return sorted(
+        rows,
+        key=lambda row: (row['avg_queries'] * row['count'], row['p95_ms']),
+        reverse=True
+    )
+
+
+def get_endpoint(request, view_func):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        match = request.resolver_match
+        return match.view_name if match else 'unresolved'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class RequestMetricsMiddleware:
+    """Measures query count, DB, serializer and total time of requests.
+
+    The numbers are sent back in the Server-Timing header and aggregated
+    per view action by the registry. Requests issuing more queries than
+    REQUEST_METRICS_QUERY_BUDGET are logged together with their SQL.
+    Queries of streamed responses run after the middleware returns and are
+    not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        _local.current = metrics
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _local.current = None
+        metrics.total_time = time.perf_counter() - start
+        if metrics.endpoint is None:
+            metrics.endpoint = get_endpoint(request, None)
+        response['Server-Timing'] = metrics.server_timing()
+        budget = settings.REQUEST_METRICS_QUERY_BUDGET
+        if len(metrics.queries) > budget:
+            logger.warning(
+                '%s %s (%s) issued %d queries, budget is %d:\n%s',
+                request.method,
+                request.get_full_path(),
+                metrics.endpoint,
+                len(metrics.queries),
+                budget,
+                '\n'.join(
+                    f'{duration * 1000:.1f} ms: {sql}'
+                    for sql, duration in metrics.queries
+                )
+            )
+        registry.record(metrics, budget)
+        registry.publish()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.current.endpoint = get_endpoint(request, view_func)
+
+
+class RequestMetricsView(APIView):
+    """Staff-only report of the collected request metrics."""
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        return Response(get_report(collect()))
@@ -0,0 +1,32 @@
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer backed by orjson when it is installed.
+
+    orjson writes compact UTF-8 like DRF's default settings, and objects it
+    does not know (Decimal, lazy strings, sets) go through DRF's encoder.
+    Non-string keys are allowed, as the stdlib stringifies them too: DRF
+    keys ListField errors by the int index of the item.
+    Without orjson, and for indented output, DRF's stdlib renderer is used.
+    """
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type or '', renderer_context)
+        if orjson is None or indent:
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(
+            data,
+            default=self.encoder.default,
+            option=orjson.OPT_NON_STR_KEYS
+        )
@@ -25,8 +25,8 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'djoser',
     'django_filters',
-    'users',
-    'recipes',
+    'users.apps.UsersConfig',
+    'recipes.apps.RecipesConfig',
 ]
 
 MIDDLEWARE = [
@@ -66,10 +66,49 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
     }
 }
 
+if os.getenv('DB_CONN_HEALTH_CHECKS', default='True') == 'True':
+    MIDDLEWARE.insert(0, 'foodgram.db.ConnectionHealthCheckMiddleware')
+DB_CONN_HEALTH_CHECK_IDLE = int(
+    os.getenv('DB_CONN_HEALTH_CHECK_IDLE', default=10)
+)
+
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(','))
+):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', default=10))
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['foodgram.db.ReplicaRouter']
+    MIDDLEWARE.append('foodgram.db.ReplicaRoutingMiddleware')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+# LocMemCache lives inside one process, so versions, pins and metrics kept
+# in it are not seen by the other gunicorn workers.
+CACHE_SHARED = not CACHES['default']['BACKEND'].endswith(
+    ('LocMemCache', 'DummyCache')
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -107,10 +146,14 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS':
         'recipes.pagination.CustomPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodgram.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 DJOSER = {
@@ -126,3 +169,38 @@ DJOSER = {
 }
 
 AUTH_USER_MODEL = 'users.User'
+
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', default=300))
+
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', default='russian')
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=1000))
+FEED_BACKFILL_LIMIT = int(os.getenv('FEED_BACKFILL_LIMIT', default=100))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+INGREDIENT_INDEX_CHECK_INTERVAL = int(
+    os.getenv('INGREDIENT_INDEX_CHECK_INTERVAL', default=30)
+)
+
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', default='False') == 'True'
+REQUEST_METRICS_QUERY_BUDGET = int(
+    os.getenv('REQUEST_METRICS_QUERY_BUDGET', default=20)
+)
+REQUEST_METRICS_PUBLISH_INTERVAL = int(
+    os.getenv('REQUEST_METRICS_PUBLISH_INTERVAL', default=10)
+)
+REQUEST_METRICS_SLOTS = int(os.getenv('REQUEST_METRICS_SLOTS', default=64))
+if REQUEST_METRICS:
+    MIDDLEWARE.insert(0, 'foodgram.metrics.RequestMetricsMiddleware')
+
+COMPRESSION = os.getenv('COMPRESSION', default='True') == 'True'
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', default=1024))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', default=5))
+COMPRESSION_EXCLUDE_PATHS = tuple(filter(None, os.getenv(
+    'COMPRESSION_EXCLUDE_PATHS',
+    default='/api/auth/,/admin/'
+).split(',')))
+if COMPRESSION:
+    MIDDLEWARE.insert(0, 'foodgram.compression.CompressionMiddleware')
@@ -0,0 +1,64 @@
+from rest_framework import permissions
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """Limits the representation to the given ``fields``.
+
+    Nested objects listed in ``compact_fields`` are replaced by the compact
+    field built by the mapped factory (their ids) unless named in
+    ``expand``. Without ``fields`` everything is rendered in full.
+    """
+    compact_fields = {}
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse_fields = fields
+        self.expand = expand
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.sparse_fields is None:
+            return fields
+        return {
+            name: (
+                self.compact_fields[name]()
+                if name in self.compact_fields and name not in self.expand
+                else field
+            )
+            for name, field in fields.items()
+            if name in self.sparse_fields
+        }
+
+
+class SparseFieldsetViewMixin:
+    """Passes ``?fields=`` and ``?expand=`` to serializers of safe requests.
+
+    Both take comma-separated top-level field names; unknown names are
+    ignored. Only serializers built on SparseFieldsetMixin receive them.
+    Views use ``sparse_fields`` and ``expand`` to fetch only
+    what the requested fields need.
+    """
+
+    @property
+    def sparse_fields(self):
+        value = self.request.query_params.get(FIELDS_PARAM)
+        return None if value is None else parse_names(value)
+
+    @property
+    def expand(self):
+        return parse_names(self.request.query_params.get(EXPAND_PARAM, ''))
+
+    def get_serializer(self, *args, **kwargs):
+        if (self.request.method in permissions.SAFE_METHODS
+                and issubclass(self.get_serializer_class(),
+                               SparseFieldsetMixin)):
+            kwargs.setdefault('fields', self.sparse_fields)
+            kwargs.setdefault('expand', self.expand)
+        return super().get_serializer(*args, **kwargs)
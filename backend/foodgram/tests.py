@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from . import compression, db, metrics
+
+
+def record(registry, endpoint):
+    request = metrics.RequestMetrics()
+    request.endpoint = endpoint
+    registry.record(request, budget=10)
+    registry.publish(force=True)
+
+
+@override_settings(REQUEST_METRICS_SLOTS=3)
+class MetricsRegistryTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.workers = []
+        for name in ('web:1', 'web:2'):
+            registry = metrics.MetricsRegistry()
+            registry.worker = name
+            self.workers.append(registry)
+
+    def test_workers_publish_to_own_slots(self):
+        record(self.workers[0], 'RecipeViewSet.list')
+        record(self.workers[1], 'RecipeViewSet.list')
+        record(self.workers[1], 'RecipeViewSet.retrieve')
+        record(self.workers[0], 'RecipeViewSet.list')
+        stats = metrics.collect()
+        self.assertEqual(stats['RecipeViewSet.list']['count'], 3)
+        self.assertEqual(stats['RecipeViewSet.retrieve']['count'], 1)
+
+    def test_expired_slot_reclaimed(self):
+        record(self.workers[0], 'RecipeViewSet.list')
+        cache.delete(self.workers[0]._slot)
+        record(self.workers[1], 'RecipeViewSet.list')
+        record(self.workers[0], 'RecipeViewSet.list')
+        self.assertNotEqual(self.workers[0]._slot, self.workers[1]._slot)
+        self.assertEqual(metrics.collect()['RecipeViewSet.list']['count'], 3)
+
+
+class ConnectionHealthCheckTests(TestCase):
+    def test_only_idle_connections_checked(self):
+        middleware = db.ConnectionHealthCheckMiddleware(
+            lambda request: HttpResponse()
+        )
+        connection.ensure_connection()
+        with mock.patch.object(connection, 'is_usable') as is_usable:
+            with override_settings(DB_CONN_HEALTH_CHECK_IDLE=60):
+                middleware(None)
+                middleware(None)
+            self.assertEqual(is_usable.call_count, 1)
+            with override_settings(DB_CONN_HEALTH_CHECK_IDLE=0):
+                middleware(None)
+            self.assertEqual(is_usable.call_count, 2)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    @override_settings(CACHE_SHARED=False)
+    def test_shared_cache_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            db.ReplicaRoutingMiddleware(lambda request: HttpResponse())
+
+
+@override_settings(COMPRESSION_MIN_SIZE=10,
+                   COMPRESSION_EXCLUDE_PATHS=('/api/auth/', ))
+class CompressionMiddlewareTests(SimpleTestCase):
+    def get(self, path):
+        middleware = compression.CompressionMiddleware(
+            lambda request: HttpResponse(b'{"auth_token": "secret"}' * 10)
+        )
+        return middleware(
+            RequestFactory().get(path, HTTP_ACCEPT_ENCODING='gzip')
+        )
+
+    def test_compressed(self):
+        self.assertEqual(self.get('/api/recipes/')['Content-Encoding'], 'gzip')
+
+    def test_excluded_paths_not_compressed(self):
+        response = self.get('/api/auth/token/login/')
+        self.assertNotIn('Content-Encoding', response)
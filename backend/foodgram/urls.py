@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from .metrics import RequestMetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/metrics/', RequestMetricsView.as_view()),
     path('api/', include('users.urls')),
     path('api/', include('recipes.urls'))
 ]
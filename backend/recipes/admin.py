@@ -31,7 +31,9 @@ class RecipeAdmin(admin.ModelAdmin):
                     'text',
                     'image',
                     'author',
-                    'cooking_time'
+                    'cooking_time',
+                    'favorites_count',
+                    'in_carts_count'
                     )
 
     def get_tags(self, obj):
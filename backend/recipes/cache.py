@@ -0,0 +1,119 @@
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ShoppingCart
+
+AUTHOR_VERSION_KEY = 'author_version:{user_id}'
+CART_VERSION_KEY = 'shopping_cart_version:{user_id}'
+INGREDIENTS_VERSION_KEY = 'ingredients_version'
+TAGS_VERSION_KEY = 'tags_version'
+LIST_KEY = '{version_key}:{version}:{format}'
+LIST_TIMEOUT = 60 * 60 * 24
+RECIPE_KEY = 'recipe:{recipe_id}:{version}'
+RECIPE_TIMEOUT = 60 * 60 * 24
+SHOPPING_LIST_KEY = 'shopping_list:{user_id}:{version}:{format}'
+SHOPPING_LIST_TIMEOUT = 60 * 60 * 24
+
+
+def get_version(key):
+    """Returns the version stored under the key, issuing one if missing.
+
+    Versions are random, so invalidating means deleting the key: anything
+    cached under an old version is never looked up again and expires on
+    its own.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        return cache.get(key)
+    return version
+
+
+def get_versions(keys):
+    """Same as get_version for several keys in one cache round trip."""
+    versions = cache.get_many(keys)
+    return [versions.get(key) or get_version(key) for key in keys]
+
+
+def invalidate_versions(keys):
+    """Drops the versions once the current transaction commits.
+
+    Dropping them earlier would let a concurrent request cache the rows
+    about to be replaced under the new version.
+    """
+    keys = list(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_cart_version(user_id):
+    return get_version(CART_VERSION_KEY.format(user_id=user_id))
+
+
+def invalidate_cart_versions(user_ids):
+    invalidate_versions([
+        CART_VERSION_KEY.format(user_id=user_id) for user_id in user_ids
+    ])
+
+
+def invalidate_recipe_carts(recipe):
+    """Invalidates carts of every user who has the recipe in the cart."""
+    invalidate_cart_versions(
+        ShoppingCart.objects.filter(recipe=recipe).values_list(
+            'user_id',
+            flat=True
+        )
+    )
+
+
+def invalidate_author_versions(user_ids):
+    invalidate_versions([
+        AUTHOR_VERSION_KEY.format(user_id=user_id) for user_id in user_ids
+    ])
+
+
+def get_recipe_version(updated_at, author_id, host):
+    """Digest of everything the cached representation of a recipe shows.
+
+    Besides the recipe itself that is its tags, ingredients and author, and
+    the host the image links are built for.
+    """
+    versions = get_versions((
+        TAGS_VERSION_KEY,
+        INGREDIENTS_VERSION_KEY,
+        AUTHOR_VERSION_KEY.format(user_id=author_id)
+    ))
+    return hashlib.md5(
+        ':'.join((host, updated_at.isoformat(), *versions)).encode()
+    ).hexdigest()
+
+
+def get_recipe_key(recipe_id, version):
+    return RECIPE_KEY.format(recipe_id=recipe_id, version=version)
+
+
+def get_list_key(version_key, version, file_format):
+    return LIST_KEY.format(
+        version_key=version_key,
+        version=version,
+        format=file_format
+    )
+
+
+def get_shopping_list_key(user_id, version, file_format):
+    return SHOPPING_LIST_KEY.format(
+        user_id=user_id,
+        version=version,
+        format=file_format
+    )
+
+
+def cache_stream(key, chunks, timeout=SHOPPING_LIST_TIMEOUT):
+    """Passes chunks through and caches their concatenation at the end."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(parts), timeout)
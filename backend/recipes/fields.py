@@ -0,0 +1,66 @@
+import base64
+import binascii
+import uuid
+import warnings
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+BASE64_CHUNK_SIZE = 64 * 1024
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Base64ImageField that decodes the payload chunk by chunk.
+
+    Decoded bytes go to a temporary file that only stays in memory up to
+    FILE_UPLOAD_MAX_MEMORY_SIZE. The whole decoded image is never held in
+    memory next to the base64 string. Images over Pillow's
+    MAX_IMAGE_PIXELS are rejected before anything decodes their pixels.
+    """
+
+    def decode(self, payload):
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        try:
+            for start in range(0, len(payload), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    payload[start:start + BASE64_CHUNK_SIZE],
+                    validate=True
+                ))
+            file.seek(0)
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', Image.DecompressionBombWarning)
+                image_format = Image.open(file).format.lower()
+        except (binascii.Error, ValueError, OSError,
+                Image.DecompressionBombError, Image.DecompressionBombWarning):
+            file.close()
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        file.seek(0)
+        return file, 'jpg' if image_format == 'jpeg' else image_format
+
+    def to_internal_value(self, data):
+        if data in self.EMPTY_VALUES or not isinstance(data, str):
+            return super().to_internal_value(data)
+        content_type = None
+        if ';base64,' in data:
+            header, data = data.split(';base64,', 1)
+            if self.trust_provided_content_type:
+                content_type = header.replace('data:', '')
+        file, extension = self.decode(data)
+        if extension not in self.ALLOWED_TYPES:
+            file.close()
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        file.seek(0, 2)
+        size = file.tell()
+        file.seek(0)
+        return super(Base64FieldMixin, self).to_internal_value(UploadedFile(
+            file,
+            name=f'{uuid.uuid4()}.{extension}',
+            content_type=content_type,
+            size=size
+        ))
@@ -1,6 +1,12 @@
 import django_filters
 
 from .models import Ingredient, Recipe, Tag
+from .search import search_recipes
+
+RECIPE_ORDERING_CHOICES = (
+    ('popular', 'popularity'),
+    ('trending', 'trending'),
+)
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -14,10 +20,16 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.BooleanFilter(
         method='shopping_cart_filter'
     )
+    search = django_filters.CharFilter(method='search_filter')
+    ordering = django_filters.ChoiceFilter(
+        choices=RECIPE_ORDERING_CHOICES,
+        method='ordering_filter'
+    )
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering']
 
     def favorited_filter(self, queryset, name, value):
         user = self.request.user
@@ -31,6 +43,22 @@ class RecipeFilter(django_filters.FilterSet):
             return queryset.filter(shopping_carts__user=user)
         return queryset
 
+    def search_filter(self, queryset, name, value):
+        """Full-text search ranked by relevance (see recipes.search)."""
+        return search_recipes(queryset, value)
+
+    def ordering_filter(self, queryset, name, value):
+        """Orders by a precomputed RecipeScore column (see refresh_scores).
+
+        Recipes get a score row when created, so the inner join drops only
+        recipes older than the scores that refresh_scores has not reached.
+        """
+        field = dict(RECIPE_ORDERING_CHOICES)[value]
+        return queryset.filter(score__isnull=False).order_by(
+            f'-score__{field}',
+            '-id'
+        )
+
 
 class IngredientFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(
@@ -0,0 +1,143 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+IMAGE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+VARIANT_PATH = 'recipes/variants/{stem}/{variant}.{extension}'
+
+
+def get_variant_path(name, variant, extension):
+    return VARIANT_PATH.format(
+        stem=os.path.splitext(os.path.basename(name))[0],
+        variant=variant,
+        extension=extension
+    )
+
+
+def get_image_variants(recipe, request=None):
+    """Returns variant URLs by size and format, or None until they exist."""
+    name = recipe.image.name
+    if not name or recipe.variants_image != name:
+        return None
+    variants = {}
+    for variant in IMAGE_VARIANTS:
+        variants[variant] = {}
+        for extension in IMAGE_FORMATS:
+            url = default_storage.url(
+                get_variant_path(name, variant, extension)
+            )
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            variants[variant][extension] = url
+    return variants
+
+
+def open_image(name):
+    with default_storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def render_variant(image, size, image_format, options):
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and variant.mode == 'RGBA':
+        background = Image.new('RGB', variant.size, 'white')
+        background.paste(variant, mask=variant.getchannel('A'))
+        variant = background
+    output = BytesIO()
+    variant.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def delete_image_variants(name):
+    for variant in IMAGE_VARIANTS:
+        for extension in IMAGE_FORMATS:
+            default_storage.delete(get_variant_path(name, variant, extension))
+
+
+def build_image_variants(recipe_id, name):
+    """Writes every size and format of the image and marks them ready.
+
+    The recipe is only marked if its image is still the one processed, so
+    a newer upload is never shown with the variants of an older one. The
+    variants of the image it replaces are deleted then.
+    """
+    image = open_image(name)
+    for variant, size in IMAGE_VARIANTS.items():
+        for extension, (image_format, options) in IMAGE_FORMATS.items():
+            path = get_variant_path(name, variant, extension)
+            content = render_variant(image, size, image_format, options)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            default_storage.save(path, ContentFile(content))
+    recipe = Recipe.objects.filter(pk=recipe_id, image=name)
+    previous = recipe.values_list('variants_image', flat=True).first()
+    updated = recipe.update(variants_image=name, updated_at=timezone.now())
+    if updated and previous and previous != name:
+        delete_image_variants(previous)
+
+
+def try_build_image_variants(recipe_id, name):
+    try:
+        build_image_variants(recipe_id, name)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', name)
+
+
+def build_in_worker(recipe_id, name):
+    try:
+        try_build_image_variants(recipe_id, name)
+    finally:
+        connections.close_all()
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.IMAGE_WORKERS,
+        thread_name_prefix='recipe-images'
+    )
+
+
+def schedule_image_variants(recipe):
+    """Builds the variants after the transaction commits.
+
+    With IMAGE_WORKERS > 0 they are built by a background thread pool,
+    otherwise synchronously. Failures are logged and leave the recipe
+    without variants; the build_image_variants command retries them.
+    """
+    recipe_id, name = recipe.pk, recipe.image.name
+    if settings.IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(build_in_worker, recipe_id, name)
+        )
+    else:
+        transaction.on_commit(
+            lambda: try_build_image_variants(recipe_id, name)
+        )
@@ -0,0 +1,94 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .cache import INGREDIENTS_VERSION_KEY, get_version
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """Per-process, case-folded sorted index over the ingredient dictionary.
+
+    The index is built on first use and rebuilt when the version in the
+    Django cache changes. That version reaches other workers only through a
+    shared cache backend, so every INGREDIENT_INDEX_CHECK_INTERVAL seconds
+    the index also compares a stamp of the table (row count, last id and
+    last change) and rebuilds when it differs. Other lookups never touch
+    the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = (None, [], [])
+        self._checked_at = None
+
+    def _get_stamp(self):
+        stamp = Ingredient.objects.aggregate(
+            count=Count('id'),
+            last_id=Max('id'),
+            updated_at=Max('updated_at')
+        )
+        self._checked_at = time.monotonic()
+        return tuple(stamp.values())
+
+    def _build(self, version, stamp):
+        entries = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        self._index = (
+            (version, stamp),
+            [entry[0] for entry in entries],
+            entries
+        )
+
+    def _is_due(self):
+        return (
+            self._checked_at is None
+            or time.monotonic() - self._checked_at
+            >= settings.INGREDIENT_INDEX_CHECK_INTERVAL
+        )
+
+    def _get_index(self):
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        current = self._index[0]
+        if current is None or version != current[0] or self._is_due():
+            with self._lock:
+                current = self._index[0]
+                stamp = self._get_stamp()
+                if current != (version, stamp):
+                    self._build(version, stamp)
+        return self._index
+
+    def search(self, query, limit):
+        """Returns up to ``limit`` ingredients whose name contains the query.
+
+        Names that start with the query come first, in alphabetical order,
+        followed by names that only contain it.
+        """
+        _, keys, entries = self._get_index()
+        query = query.casefold()
+        start = bisect.bisect_left(keys, query)
+        end = start
+        while (end < len(keys) and end - start < limit
+               and keys[end].startswith(query)):
+            end += 1
+        matches = entries[start:end]
+        if len(matches) < limit:
+            for entry in entries:
+                if query in entry[0] and not entry[0].startswith(query):
+                    matches.append(entry)
+                    if len(matches) == limit:
+                        break
+        return [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in matches
+        ]
+
+
+ingredient_index = IngredientIndex()
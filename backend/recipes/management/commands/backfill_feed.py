@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.models import FeedEntry
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Заполняет ленты подписок последними рецептами авторов, на '
+            'которых подписаны пользователи. Нужна после первого деплоя '
+            'ленты, после изменения FEED_FANOUT_LIMIT и для авторов, число '
+            'подписчиков которых опустилось ниже этого порога. Уже '
+            'добавленные записи пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=settings.FEED_BACKFILL_LIMIT,
+            help='Сколько последних рецептов каждого автора добавить.'
+        )
+
+    def handle(self, *args, **options):
+        authors = User.objects.filter(
+            followers_count__gt=0,
+            followers_count__lt=settings.FEED_FANOUT_LIMIT
+        ).order_by('pk').values_list('pk', flat=True)
+        added = 0
+        for author_id in authors.iterator():
+            added += FeedEntry.objects.backfill(author_id, options['limit'])
+        self.stdout.write(f'Добавлено записей в ленты: {added}')
@@ -0,0 +1,156 @@
+import json
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values."""
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа и число SQL-запросов основных эндпоинтов '
+            'API на текущей базе (SQLite или PostgreSQL) и выводит '
+            'p50/p95/p99 в формате JSON. Данные для замера создаёт '
+            'generate_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Количество замеров для каждого сценария.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Количество запросов перед замером.'
+        )
+        parser.add_argument(
+            '--prefix', default='synthetic',
+            help='Префикс пользователей generate_data.'
+        )
+        parser.add_argument(
+            '--scenarios', nargs='+',
+            help='Запустить только указанные сценарии.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Записать результат в файл вместо вывода.'
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(
+            username__startswith=options['prefix']
+        ).order_by('pk').first()
+        if user is None:
+            raise CommandError(
+                'Нет данных для замера, сначала выполните generate_data.'
+            )
+        scenarios = self.get_scenarios()
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - set(scenarios)
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+                )
+            scenarios = {
+                name: scenarios[name] for name in options['scenarios']
+            }
+        token, _ = Token.objects.get_or_create(user=user)
+        host = next(
+            (host.lstrip('.') for host in settings.ALLOWED_HOSTS
+             if host != '*'),
+            'localhost'
+        )
+        self.client = Client(
+            HTTP_HOST=host,
+            HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+        report = {
+            'database': connection.vendor,
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'requests': options['requests'],
+            'cold': options['cold'],
+            'scenarios': {
+                name: self.measure(url, options)
+                for name, url in scenarios.items()
+            },
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def get_scenarios(self):
+        recipe = Recipe.objects.order_by('-favorites_count', 'pk').first()
+        author = User.objects.order_by('-recipes_count', 'pk').first()
+        tag = Tag.objects.order_by('pk').first()
+        ingredient = Ingredient.objects.order_by('pk').first()
+        return {
+            'recipe_list': '/api/recipes/',
+            'recipe_list_tags': f'/api/recipes/?tags={tag.slug}',
+            'recipe_list_author': f'/api/recipes/?author={author.pk}',
+            'recipe_list_favorited': '/api/recipes/?is_favorited=true',
+            'recipe_list_in_cart': '/api/recipes/?is_in_shopping_cart=true',
+            'recipe_list_popular': '/api/recipes/?ordering=popular',
+            'recipe_list_trending': '/api/recipes/?ordering=trending',
+            'recipe_list_cursor': '/api/recipes/?pagination=cursor',
+            'recipe_list_compact': (
+                '/api/recipes/?fields=id,name,image,tags,author,cooking_time'
+                '&expand=author'
+            ),
+            'recipe_detail': f'/api/recipes/{recipe.pk}/',
+            'subscriptions': '/api/users/subscriptions/?recipes_limit=3',
+            'feed': '/api/users/feed/',
+            'ingredient_search': (
+                f'/api/ingredients/?name={ingredient.name[:2]}'
+            ),
+            'download_shopping_cart': '/api/recipes/download_shopping_cart/',
+        }
+
+    def request(self, url, cold):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+        return elapsed, len(queries)
+
+    def measure(self, url, options):
+        for _ in range(options['warmup']):
+            self.request(url, options['cold'])
+        timings, queries = [], []
+        for _ in range(options['requests']):
+            elapsed, count = self.request(url, options['cold'])
+            timings.append(elapsed)
+            queries.append(count)
+        timings.sort()
+        return {
+            'url': url,
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'queries': max(queries),
+        }
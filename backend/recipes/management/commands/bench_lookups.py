@@ -0,0 +1,93 @@
+import random
+import statistics
+import time
+from itertools import product
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import User
+
+MODELS = {'favorite': Favorite, 'shopping_cart': ShoppingCart}
+
+
+class Command(BaseCommand):
+    help = ('Заполняет таблицу избранного или списка покупок синтетическими '
+            'данными и замеряет время типичных запросов по (user, recipe). '
+            'Все данные удаляются по окончании замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--model', choices=MODELS, default='favorite')
+        parser.add_argument('--lookups', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        model = MODELS[options['model']]
+        users_count = options['users']
+        recipes_count = -(-options['rows'] // users_count)
+        with transaction.atomic():
+            self.fill(model, users_count, recipes_count, options)
+            self.measure(model, options['lookups'])
+            transaction.set_rollback(True)
+
+    def fill(self, model, users_count, recipes_count, options):
+        start = time.perf_counter()
+        users = User.objects.bulk_create(
+            User(username=f'bench{i}', email=f'bench{i}@bench.local',
+                 password='!')
+            for i in range(users_count)
+        )
+        if not users[0].pk:
+            users = list(User.objects.filter(username__startswith='bench'))
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=users[0], name=f'bench{i}', text='',
+                   image='recipes/bench.png', cooking_time=1)
+            for i in range(recipes_count)
+        )
+        if not recipes[0].pk:
+            recipes = list(Recipe.objects.filter(name__startswith='bench'))
+        self.user_ids = [user.pk for user in users]
+        self.recipe_ids = [recipe.pk for recipe in recipes]
+        pairs = product(self.user_ids, self.recipe_ids)
+        total = 0
+        while total < options['rows']:
+            size = min(options['batch_size'], options['rows'] - total)
+            model.objects.bulk_create(
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in (next(pairs) for _ in range(size))
+            )
+            total += size
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+        self.stdout.write(
+            f'Добавлено {total} строк за {time.perf_counter() - start:.1f} с'
+        )
+
+    def measure(self, model, lookups):
+        queries = {
+            'exists (user, recipe)': lambda: model.objects.filter(
+                user_id=random.choice(self.user_ids),
+                recipe_id=random.choice(self.recipe_ids)
+            ).exists(),
+            'recipes of user': lambda: list(model.objects.filter(
+                user_id=random.choice(self.user_ids)
+            ).values_list('recipe_id', flat=True)[:100]),
+            'users of recipe': lambda: list(model.objects.filter(
+                recipe_id=random.choice(self.recipe_ids)
+            ).values_list('user_id', flat=True)[:100]),
+        }
+        for name, query in queries.items():
+            timings = []
+            for _ in range(lookups):
+                start = time.perf_counter()
+                query()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{name}: p50 {statistics.median(timings):.3f} мс, '
+                f'p95 {timings[int(len(timings) * 0.95) - 1]:.3f} мс, '
+                f'p99 {timings[int(len(timings) * 0.99) - 1]:.3f} мс'
+            )
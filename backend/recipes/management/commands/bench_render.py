@@ -0,0 +1,120 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.utils.text import compress_string
+from foodgram import compression, renderers
+from recipes.models import Recipe
+from recipes.serializers import RecipeSerializerForRead
+from rest_framework.renderers import JSONRenderer
+
+COMPACT_FIELDS = {'id', 'name', 'image', 'tags', 'author', 'cooking_time'}
+COMPACT_EXPAND = {'author'}
+
+
+def timed(function, repeat):
+    """Median and minimum of ``repeat`` runs in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время сериализации и рендеринга страницы рецептов '
+            'стандартным JSONRenderer и FastJSONRenderer (orjson), а также '
+            'размер ответа после gzip и brotli. Полное и компактное '
+            '(?fields=) представления замеряются отдельно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=100,
+            help='Количество рецептов на странице.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Количество замеров.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Записать результат в файл вместо вывода.'
+        )
+
+    def handle(self, *args, **options):
+        if not Recipe.objects.exists():
+            raise CommandError(
+                'Нет данных для замера, сначала выполните generate_data.'
+            )
+        host = next(
+            (host.lstrip('.') for host in settings.ALLOWED_HOSTS
+             if host != '*'),
+            'localhost'
+        )
+        self.context = {
+            'request': RequestFactory(HTTP_HOST=host).get('/api/recipes/')
+        }
+        report = {
+            'recipes': options['recipes'],
+            'repeat': options['repeat'],
+            'orjson': renderers.orjson is not None,
+            'brotli': compression.brotli is not None,
+            'pages': {
+                'full': self.measure(None, (), options),
+                'compact': self.measure(
+                    COMPACT_FIELDS,
+                    COMPACT_EXPAND,
+                    options
+                ),
+            },
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def measure(self, fields, expand, options):
+        recipes = list(Recipe.objects.for_read(
+            AnonymousUser(),
+            fields,
+            expand
+        ).order_by('-id')[:options['recipes']])
+
+        def serialize():
+            return RecipeSerializerForRead(
+                recipes,
+                many=True,
+                context=self.context,
+                fields=fields,
+                expand=expand
+            ).data
+
+        data = serialize()
+        content = renderers.FastJSONRenderer().render(data)
+        sizes = {
+            'raw': len(content),
+            'gzip': len(compress_string(content)),
+        }
+        if compression.brotli is not None:
+            sizes['br'] = len(compression.brotli_string(content))
+        return {
+            'serialize': timed(serialize, options['repeat']),
+            'render': {
+                name: timed(lambda: renderer.render(data), options['repeat'])
+                for name, renderer in (
+                    ('stdlib', JSONRenderer()),
+                    ('fast', renderers.FastJSONRenderer()),
+                )
+            },
+            'bytes': sizes,
+        }
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.shopping_list import render_pdf
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время формирования PDF со списком покупок '
+            'для списков разной длины.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10, 100, 1000],
+            help='Количество строк в списке покупок.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество повторов для каждого размера.'
+        )
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            ingredients = [
+                {'name': f'Ингредиент {i}',
+                 'measurement_unit': 'г',
+                 'amount': float(i)}
+                for i in range(size)
+            ]
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                output = render_pdf(ingredients)
+                length = len(output.read())
+                timings.append(time.perf_counter() - start)
+                output.close()
+            best = min(timings) * 1000
+            mean = sum(timings) / len(timings) * 1000
+            self.stdout.write(
+                f'{size:>6} строк: min {best:.1f} мс, '
+                f'mean {mean:.1f} мс, {length} байт'
+            )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from recipes.images import build_image_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создаёт уменьшенные копии картинок (WebP и JPEG) для рецептов, '
+            'у которых их ещё нет, например после загрузки старой базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии для всех рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.exclude(variants_image=F('image'))
+        start = time.perf_counter()
+        built = failed = 0
+        for pk, name in recipes.values_list('pk', 'image').iterator():
+            try:
+                build_image_variants(pk, name)
+            except OSError as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+                continue
+            built += 1
+        self.stdout.write(
+            f'Обработано картинок: {built}, с ошибками: {failed} '
+            f'за {time.perf_counter() - start:.1f} с'
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from recipes.cache import invalidate_cart_versions
+from recipes.models import Favorite, ShoppingCart, quoted_column
+
+
+class Command(BaseCommand):
+    help = ('Удаляет повторяющиеся записи избранного и списков покупок, '
+            'оставляя самую раннюю. Запускается перед миграцией, которая '
+            'добавляет уникальность (user, recipe); после миграции '
+            'выполните recount_counters.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать дубликаты, ничего не удалять.'
+        )
+
+    def handle(self, *args, **options):
+        deleted = 0
+        for model in (Favorite, ShoppingCart):
+            with transaction.atomic(), connection.cursor() as cursor:
+                # The tables still have the pre-migration columns, so the
+                # ORM (which selects every current field and sends signals
+                # that update counters) cannot be used here.
+                table = connection.ops.quote_name(model._meta.db_table)
+                pk = quoted_column(connection, model, 'id')
+                user = quoted_column(connection, model, 'user')
+                recipe = quoted_column(connection, model, 'recipe')
+                duplicates = (
+                    f'FROM {table} WHERE {pk} NOT IN ('
+                    f'SELECT MIN({pk}) FROM {table} GROUP BY {user}, {recipe})'
+                )
+                cursor.execute(f'SELECT {user} {duplicates}')
+                user_ids = [row[0] for row in cursor.fetchall()]
+                count = len(user_ids)
+                if count and not options['dry_run']:
+                    cursor.execute(f'DELETE {duplicates}')
+                    deleted += count
+                    if model is ShoppingCart:
+                        invalidate_cart_versions(set(user_ids))
+            self.stdout.write(
+                f'{model._meta.verbose_name}: дубликатов {count}'
+            )
+        if deleted:
+            self.stdout.write(
+                'Счётчики не изменены: после migrate выполните '
+                'recount_counters.'
+            )
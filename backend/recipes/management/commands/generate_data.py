@@ -0,0 +1,186 @@
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredients,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+IMAGE = 'recipes/synthetic.png'
+PASSWORD = 'synthetic-password'
+
+
+def zipf_weights(size, skew):
+    """Cumulative weights 1 / (i + 1) ** skew for positions 0..size-1."""
+    return list(accumulate(
+        1 / (position + 1) ** skew for position in range(size)
+    ))
+
+
+def skewed_sampler(rng, population, skew):
+    """Returns a function drawing k distinct items with Zipf-like weights.
+
+    Skew 0 is uniform; larger values concentrate activity on the first
+    items (popular authors and recipes).
+    """
+    cum_weights = zipf_weights(len(population), skew)
+
+    def sample(k):
+        k = min(k, len(population))
+        chosen = set()
+        for _ in range(4):
+            chosen.update(rng.choices(
+                population,
+                cum_weights=cum_weights,
+                k=k - len(chosen)
+            ))
+            if len(chosen) == k:
+                break
+        return chosen
+    return sample
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетических пользователей, рецепты, подписки, '
+            'избранное и списки покупок для нагрузочного тестирования. '
+            'Ингредиенты и теги должны быть загружены заранее (loader_csv).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--recipes', type=int, default=5000,
+            help='Общее количество рецептов.'
+        )
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Подписок на одного пользователя.'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Рецептов в избранном одного пользователя.'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=10,
+            help='Рецептов в списке покупок одного пользователя.'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help=('Показатель распределения Ципфа для авторов и рецептов '
+                  '(0 - равномерное).')
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='synthetic')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not Ingredient.objects.exists() or not Tag.objects.exists():
+            raise CommandError(
+                'Сначала загрузите ингредиенты и теги командой loader_csv.'
+            )
+        if User.objects.filter(
+            username__startswith=options['prefix']
+        ).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {options["prefix"]} уже есть, '
+                f'укажите другой --prefix.'
+            )
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        start = time.perf_counter()
+        with transaction.atomic():
+            user_ids = self.create_users(options)
+            recipe_ids = self.create_recipes(user_ids, options)
+            self.create_relations(user_ids, recipe_ids, options)
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('refresh_scores', full=True, stdout=self.stdout)
+        call_command('backfill_feed', stdout=self.stdout)
+        self.stdout.write(
+            f'Готово за {time.perf_counter() - start:.1f} с'
+        )
+
+    def bulk_create(self, model, objects):
+        objects = list(objects)
+        model.objects.bulk_create(
+            objects,
+            batch_size=min(self.batch_size, connection.ops.bulk_batch_size(
+                model._meta.concrete_fields,
+                objects
+            )),
+            ignore_conflicts=True
+        )
+        self.stdout.write(
+            f'{model._meta.verbose_name}: добавлено {len(objects)}'
+        )
+
+    def create_users(self, options):
+        prefix = options['prefix']
+        password = make_password(PASSWORD)
+        self.bulk_create(User, (
+            User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com',
+                 first_name='Synthetic', last_name=str(i), password=password)
+            for i in range(options['users'])
+        ))
+        return list(User.objects.filter(
+            username__startswith=prefix
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_recipes(self, user_ids, options):
+        prefix = options['prefix']
+        authors = self.rng.choices(
+            user_ids,
+            cum_weights=zipf_weights(len(user_ids), options['skew']),
+            k=options['recipes']
+        )
+        self.bulk_create(Recipe, (
+            Recipe(author_id=author_id, name=f'Рецепт {i}', image=IMAGE,
+                   text='Синтетический рецепт.',
+                   cooking_time=self.rng.randint(1, 180))
+            for i, author_id in enumerate(authors)
+        ))
+        recipe_ids = list(Recipe.objects.filter(
+            author__username__startswith=prefix
+        ).order_by('pk').values_list('pk', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        self.bulk_create(RecipeIngredients, (
+            RecipeIngredients(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                              amount=self.rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in self.rng.sample(
+                ingredient_ids,
+                min(options['ingredients_per_recipe'], len(ingredient_ids))
+            )
+        ))
+        self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.rng.sample(
+                tag_ids,
+                min(options['tags_per_recipe'], len(tag_ids))
+            )
+        ))
+        return recipe_ids
+
+    def create_relations(self, user_ids, recipe_ids, options):
+        skew = options['skew']
+        sample_authors = skewed_sampler(self.rng, user_ids, skew)
+        sample_recipes = skewed_sampler(self.rng, recipe_ids, skew)
+        self.bulk_create(Follow, (
+            Follow(user_id=user_id, following_id=following_id)
+            for user_id in user_ids
+            for following_id in sample_authors(options['follows'])
+            if following_id != user_id
+        ))
+        for model, per_user in ((Favorite, options['favorites']),
+                                (ShoppingCart, options['carts'])):
+            self.bulk_create(model, (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in sample_recipes(per_user)
+            ))
@@ -1,29 +1,180 @@
 import csv
+import json
+import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.cache import (INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY,
+                           invalidate_versions)
 from recipes.models import Ingredient, Tag
 
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(file, header):
+    for row in csv.reader(file, delimiter=','):
+        if row:
+            yield dict(zip(header, row))
+
+
+def iter_json(file, header):
+    """Yields the objects of a top-level JSON array without loading it all."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив объектов.')
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('Некорректный JSON-файл.')
+            chunk = file.read(JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield {key: item[key] for key in header}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
 
 class Command(BaseCommand):
-    help = ('Добавляет данные из csv файлов директории /data/ '
-            'в базу данных. Перед добавлением удаляет все записи '
-            'используемой модели!')
-
-    def handle(self, *args, **kwargs):
-        with open('data/ingredients.csv', 'r') as csv_file:
-            rows = csv.reader(csv_file, delimiter=',')
-            header = ('name', 'measurement_unit')
-            Ingredient.objects.all().delete()
-
-            for row in rows:
-                object_dict = {key: value for key, value in zip(header, row)}
-                Ingredient.objects.get_or_create(**object_dict)
-
-        with open('data/tags.csv', 'r') as csv_file:
-            rows = csv.reader(csv_file, delimiter=',')
-            header = ('name', 'color', 'slug')
-            Tag.objects.all().delete()
-
-            for row in rows:
-                object_dict = {key: value for key, value in zip(header, row)}
-                Tag.objects.get_or_create(**object_dict)
+    help = ('Добавляет ингредиенты и теги из csv или json файлов директории '
+            '/data/ в базу данных. По умолчанию перед добавлением удаляет '
+            'все записи используемой модели; с --upsert добавляет только '
+            'новые записи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients', default='data/ingredients.csv',
+            help='Файл с ингредиентами (.csv или .json).'
+        )
+        parser.add_argument(
+            '--tags', default='data/tags.csv',
+            help='Файл с тегами (.csv или .json).'
+        )
+        parser.add_argument(
+            '--upsert', action='store_true',
+            help=('Не удалять существующие записи, добавить только '
+                  'отсутствующие.')
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество записей, добавляемых одним запросом.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.load(
+                Ingredient,
+                options['ingredients'],
+                header=('name', 'measurement_unit'),
+                key_fields=('name', 'measurement_unit'),
+                **options
+            )
+            self.load(
+                Tag,
+                options['tags'],
+                header=('name', 'color', 'slug'),
+                key_fields=('slug',),
+                unique_fields=('name', 'color'),
+                **options
+            )
+        invalidate_versions((INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY))
+        if not settings.CACHE_SHARED:
+            self.stderr.write(self.style.WARNING(
+                'Кэш не общий для процессов (LocMemCache): запущенные '
+                'web-процессы не увидят изменений до перезапуска.'
+            ))
+
+    def skip_conflicts(self, model, rows, unique_fields):
+        """Drops rows that share a unique value with another row.
+
+        Such rows differ from the existing ones by key, e.g. a tag with a
+        new slug but a taken name or color. Inserting them would abort the
+        whole import, so they are reported and skipped instead.
+        """
+        taken = {
+            field: set(model.objects.filter(**{
+                f'{field}__in': {row[field] for row in rows}
+            }).values_list(field, flat=True))
+            for field in unique_fields
+        }
+        accepted = []
+        for row in rows:
+            clashes = [
+                field for field in unique_fields if row[field] in taken[field]
+            ]
+            if clashes:
+                self.stderr.write(
+                    f'{model._meta.verbose_name}: пропущена запись {row}, '
+                    f'уже заняты поля {", ".join(clashes)}'
+                )
+                continue
+            for field in unique_fields:
+                taken[field].add(row[field])
+            accepted.append(row)
+        return accepted
+
+    def load(self, model, path, header, key_fields, unique_fields=(),
+             **options):
+        """Streams the file into the model in batches of bulk inserts.
+
+        Rows whose key fields already exist in the table (or earlier in the
+        file) are skipped, so each batch costs one lookup and one insert.
+        Rows clashing on ``unique_fields`` are reported and skipped.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in ('.csv', '.json'):
+            raise CommandError(f'Неподдерживаемый формат файла: {path}')
+        start = time.perf_counter()
+        if not options['upsert']:
+            model.objects.all().delete()
+        reader = iter_json if extension == '.json' else iter_csv
+        total = created = skipped = 0
+        with open(path, 'r', encoding='utf-8') as file:
+            for batch in batches(reader(file, header),
+                                 options['batch_size']):
+                total += len(batch)
+                rows = {
+                    tuple(row[field] for field in key_fields): row
+                    for row in batch
+                }
+                existing = set(model.objects.filter(**{
+                    f'{key_fields[0]}__in': {key[0] for key in rows}
+                }).values_list(*key_fields))
+                new_rows = [
+                    row for key, row in rows.items() if key not in existing
+                ]
+                if unique_fields:
+                    accepted = self.skip_conflicts(
+                        model,
+                        new_rows,
+                        unique_fields
+                    )
+                    skipped += len(new_rows) - len(accepted)
+                    new_rows = accepted
+                model.objects.bulk_create(model(**row) for row in new_rows)
+                created += len(new_rows)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{model._meta.verbose_name}: прочитано {total}, '
+            f'добавлено {created}, пропущено из-за конфликтов {skipped} '
+            f'за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с)'
+        )
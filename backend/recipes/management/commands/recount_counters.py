@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.ranking import count_subquery
+from users.models import Follow, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'following'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного, списков покупок, рецептов '
+            'и подписчиков и исправляет расхождения.')
+
+    def handle(self, *args, **options):
+        for model, counter, related_model, field in COUNTERS:
+            with transaction.atomic():
+                actual = count_subquery(related_model, field)
+                drifted = model.objects.annotate(
+                    actual=actual
+                ).exclude(**{counter: F('actual')}).count()
+                if drifted:
+                    model.objects.update(**{counter: actual})
+            self.stdout.write(
+                f'{model._meta.verbose_name}.{counter}: '
+                f'исправлено записей {drifted}'
+            )
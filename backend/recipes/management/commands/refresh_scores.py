@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.ranking import TRENDING_DAYS, refresh_scores
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинг рецептов для сортировки по популярности. '
+            'По умолчанию пересчитывает только рецепты, у которых была '
+            'активность с прошлого запуска.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать рейтинг всех рецептов.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=TRENDING_DAYS,
+            help='Период в днях для сортировки trending.'
+        )
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help=('Повторять пересчёт каждые N секунд '
+                  '(0 - выполнить один раз).')
+        )
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            start = time.perf_counter()
+            written = refresh_scores(full=full, days=options['days'])
+            self.stdout.write(
+                f'Пересчитано рецептов: {written} '
+                f'за {time.perf_counter() - start:.2f} с'
+            )
+            if not options['interval']:
+                return
+            full = False
+            time.sleep(options['interval'])
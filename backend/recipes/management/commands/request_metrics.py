@@ -0,0 +1,52 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from foodgram.metrics import collect, get_report
+
+COLUMNS = (
+    ('endpoint', '<40'),
+    ('count', '>7'),
+    ('avg_queries', '>11'),
+    ('max_queries', '>11'),
+    ('over_budget', '>11'),
+    ('avg_db_ms', '>9'),
+    ('avg_serializer_ms', '>17'),
+    ('p50_ms', '>8'),
+    ('p95_ms', '>8'),
+    ('p99_ms', '>8'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Выводит собранную RequestMetricsMiddleware статистику запросов: '
+            'число SQL-запросов и время ответа по каждому действию, начиная '
+            'с самых нагружающих базу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Вывести отчёт в формате JSON.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Количество выводимых действий.'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.CACHE_SHARED:
+            self.stderr.write(self.style.WARNING(
+                'Кэш не общий для процессов (LocMemCache): метрики '
+                'web-процессов недоступны, отчёт будет пустым.'
+            ))
+        report = get_report(collect())[:options['limit']]
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write(' '.join(
+            f'{name:{spec}}' for name, spec in COLUMNS
+        ))
+        for row in report:
+            self.stdout.write(' '.join(
+                f'{row[name]:{spec}}' for name, spec in COLUMNS
+            ))
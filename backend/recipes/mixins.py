@@ -1,4 +1,10 @@
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from rest_framework import mixins, viewsets
+from rest_framework.response import Response
+
+from .cache import LIST_TIMEOUT, get_list_key, get_version
 
 
 class RetrieveListViewSet(
@@ -7,3 +13,27 @@ class RetrieveListViewSet(
     viewsets.GenericViewSet
 ):
     pass
+
+
+class CachedListMixin:
+    """Caches the serialized list under a version dropped by model signals.
+
+    The version also serves as a strong ETag, so clients revalidating an
+    unchanged list get a 304 without the list being read or rendered.
+    """
+    list_version_key = None
+
+    def list(self, request, *args, **kwargs):
+        version = get_version(self.list_version_key)
+        file_format = request.accepted_renderer.format
+        etag = quote_etag(f'{version}-{file_format}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            key = get_list_key(self.list_version_key, version, file_format)
+            data = cache.get(key)
+            if data is None:
+                data = super().list(request, *args, **kwargs).data
+                cache.set(key, data, LIST_TIMEOUT)
+            response = Response(data)
+        response['ETag'] = etag
+        return response
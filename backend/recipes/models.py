@@ -1,10 +1,28 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from users.models import Follow
 
 from .validators import is_convertible_to_color
 
 User = get_user_model()
 
+# Recipe columns read by each field of RecipeSerializerForRead.
+READ_COLUMNS = {
+    'author': ('author', ),
+    'name': ('name', ),
+    'image': ('image', ),
+    'image_variants': ('image', 'variants_image'),
+    'text': ('text', ),
+    'cooking_time': ('cooking_time', ),
+}
+
+# Sent by UserRecipeQuerySet.add/remove, which bypass the model signals,
+# with the ids of the recipes actually added or removed.
+relations_changed = Signal(providing_args=('user_id', 'recipe_ids', 'delta'))
+
 
 class Tag(models.Model):
     name = models.CharField('Название', max_length=25, unique=True)
@@ -23,16 +41,139 @@ class Tag(models.Model):
 class Ingredient(models.Model):
     name = models.CharField('Название ингредиента', max_length=200)
     measurement_unit = models.CharField('Единица измерения', max_length=30)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     def __str__(self):
         return f'{self.name},{self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """Annotates recipes with the per-user flags used by the API."""
+        if user.is_anonymous:
+            false = models.Value(False, output_field=models.BooleanField())
+            return self.annotate(is_favorited=false, is_in_shopping_cart=false)
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user,
+                recipe=models.OuterRef('pk')
+            )),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user,
+                recipe=models.OuterRef('pk')
+            )),
+        )
+
+    def with_author_subscribed(self, user):
+        """Annotates recipes with whether the given user follows the author."""
+        if user.is_anonymous:
+            return self.annotate(is_subscribed=models.Value(
+                False,
+                output_field=models.BooleanField()
+            ))
+        return self.annotate(is_subscribed=models.Exists(
+            Follow.objects.filter(
+                user=user,
+                following=models.OuterRef('author')
+            )
+        ))
+
+    def latest_per_author(self, limit=None):
+        """Limits the queryset to the ``limit`` newest recipes of each author.
+
+        Meant for prefetching previews for a page of authors in one query.
+        """
+        queryset = self.order_by('-id')
+        if limit is None:
+            return queryset
+        return queryset.filter(pk__in=models.Subquery(
+            Recipe.objects.filter(
+                author=models.OuterRef('author')
+            ).order_by('-id').values('pk')[:limit]
+        ))
+
+    def feed_ids(self, user, before=None, limit=None):
+        """Ids of the newest recipes of the authors the user follows.
+
+        Recipes of authors with fewer than FEED_FANOUT_LIMIT followers are
+        read from the user's FeedEntry timeline, copied there on publish;
+        recipes of more followed authors are read from the recipes table,
+        as copying them to every follower would be too expensive. Each
+        source is one query walking an index from ``before`` down, and the
+        two are merged here.
+        """
+        timeline = FeedEntry.objects.filter(user=user)
+        direct = self.filter(author__in=list(Follow.objects.filter(
+            user=user,
+            following__followers_count__gte=settings.FEED_FANOUT_LIMIT
+        ).values_list('following', flat=True)))
+        if before is not None:
+            timeline = timeline.filter(recipe_id__lt=before)
+            direct = direct.filter(pk__lt=before)
+        ids = set(timeline.order_by('-recipe_id').values_list(
+            'recipe_id',
+            flat=True
+        )[:limit])
+        ids.update(direct.order_by('-id').values_list('pk', flat=True)[:limit])
+        return sorted(ids, reverse=True)[:limit]
+
+    def for_read(self, user, fields=None, expand=()):
+        """Fetches everything RecipeSerializerForRead needs up front.
+
+        A page of recipes costs a fixed number of queries regardless of
+        its size: one for the recipes, one each for authors, tags and
+        ingredients. With ``fields`` and ``expand`` (see foodgram.sparse)
+        only the columns, flags and prefetches of the requested fields are
+        fetched, and nested objects that are not expanded are fetched as
+        ids only.
+        """
+        def wanted(name):
+            return fields is None or name in fields
+
+        def expanded(name):
+            return fields is None or name in expand
+
+        queryset = self
+        if fields is not None:
+            queryset = queryset.only('id', *{
+                column
+                for name, columns in READ_COLUMNS.items() if name in fields
+                for column in columns
+            })
+        if wanted('is_favorited') or wanted('is_in_shopping_cart'):
+            queryset = queryset.with_user_flags(user)
+        lookups = []
+        if wanted('author') and expanded('author'):
+            lookups.append(models.Prefetch(
+                'author',
+                queryset=User.objects.for_read(user)
+            ))
+        if wanted('tags'):
+            lookups.append('tags' if expanded('tags') else models.Prefetch(
+                'tags',
+                queryset=Tag.objects.only('id')
+            ))
+        if wanted('ingredients') and expanded('ingredients'):
+            lookups.append(models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredient'
+                )
+            ))
+        elif wanted('ingredients'):
+            lookups.append(models.Prefetch(
+                'ingredients',
+                queryset=Ingredient.objects.only('id')
+            ))
+        return queryset.prefetch_related(*lookups)
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='recipes',
+        db_index=False
     )
     name = models.CharField(
         'Название',
@@ -42,6 +183,12 @@ class Recipe(models.Model):
         'Картинка',
         upload_to='recipes/',
     )
+    variants_image = models.CharField(
+        'Картинка с готовыми уменьшенными копиями',
+        max_length=100,
+        blank=True,
+        editable=False
+    )
     text = models.TextField(
         'Описание'
     )
@@ -53,11 +200,48 @@ class Recipe(models.Model):
         through='RecipeIngredients'
     )
     cooking_time = models.IntegerField('Время приготовления',)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок',
+        default=0,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        # Serves the newest recipes of given authors (feeds, previews) as
+        # well as every lookup by author, so the foreign key has no index.
+        indexes = (models.Index(
+            fields=('author', 'id'),
+            name='recipe_author_id_idx'
+        ),
+        )
 
     def __str__(self):
         return f'{self.name} от  {self.author}'
 
 
+class RecipeIngredientsQuerySet(models.QuerySet):
+    def shopping_list(self, user):
+        """Sums ingredient amounts over the user's shopping cart.
+
+        The totals are grouped by ingredient name and measurement unit and
+        computed by the database in a single query.
+        """
+        return self.filter(recipe__shopping_carts__user=user).values(
+            name=models.F('ingredient__name'),
+            measurement_unit=models.F('ingredient__measurement_unit'),
+        ).annotate(
+            amount=models.Sum('amount')
+        ).order_by('name', 'measurement_unit')
+
+
 class RecipeIngredients(models.Model):
     recipe = models.ForeignKey(
         Recipe,
@@ -67,6 +251,8 @@ class RecipeIngredients(models.Model):
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
     amount = models.FloatField('Количество ингредиента',)
 
+    objects = RecipeIngredientsQuerySet.as_manager()
+
     class Meta:
         constraints = (models.UniqueConstraint(
             fields=('recipe', 'ingredient'),
@@ -79,18 +265,120 @@ class RecipeIngredients(models.Model):
                 f'{self.amount}')
 
 
+class UserRecipeQuerySet(models.QuerySet):
+    """Adds and removes (user, recipe) rows in one statement each.
+
+    Both methods return the ids of the recipes actually affected, so the
+    caller learns from a single round trip whether the relation existed.
+    """
+
+    @property
+    def _write_db(self):
+        return self._db or router.db_for_write(self.model)
+
+    def _execute(self, sql, params):
+        with connections[self._write_db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def _changed(self, user, recipe_ids, delta):
+        if recipe_ids:
+            relations_changed.send(
+                sender=self.model,
+                user_id=user.id,
+                recipe_ids=recipe_ids,
+                delta=delta
+            )
+        return recipe_ids
+
+    def add(self, user, recipe_ids):
+        """Inserts the missing relations, ignoring those that exist."""
+        if not recipe_ids:
+            return []
+        connection = connections[self._write_db]
+        ops = connection.ops
+        opts = self.model._meta
+        columns = ', '.join(
+            ops.quote_name(opts.get_field(name).column)
+            for name in ('user', 'recipe', 'created')
+        )
+        recipe_pk = ops.quote_name(Recipe._meta.pk.column)
+        sql = (
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{ops.quote_name(opts.db_table)} ({columns}) '
+            f'SELECT %s, {recipe_pk}, %s '
+            f'FROM {ops.quote_name(Recipe._meta.db_table)} '
+            f'WHERE {recipe_pk} IN ({", ".join(["%s"] * len(recipe_ids))}) '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)} '
+            f'RETURNING {ops.quote_name(opts.get_field("recipe").column)}'
+        )
+        created = opts.get_field('created').get_db_prep_value(
+            timezone.now(),
+            connection
+        )
+        with transaction.atomic(using=self._write_db):
+            return self._changed(user, self._execute(
+                sql,
+                [user.id, created, *recipe_ids]
+            ), 1)
+
+    def remove(self, user, recipe_ids):
+        """Deletes the relations that exist."""
+        if not recipe_ids:
+            return []
+        ops = connections[self._write_db].ops
+        opts = self.model._meta
+        recipe_column = ops.quote_name(opts.get_field('recipe').column)
+        sql = (
+            f'DELETE FROM {ops.quote_name(opts.db_table)} '
+            f'WHERE {ops.quote_name(opts.get_field("user").column)} = %s '
+            f'AND {recipe_column} IN ({", ".join(["%s"] * len(recipe_ids))}) '
+            f'RETURNING {recipe_column}'
+        )
+        with transaction.atomic(using=self._write_db):
+            return self._changed(user, self._execute(
+                sql,
+                [user.id, *recipe_ids]
+            ), -1)
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='favorites'
+        related_name='favorites',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
-        related_name='favorites'
+        related_name='favorites',
+        db_index=False
+    )
+    created = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        db_index=True
     )
 
+    objects = UserRecipeQuerySet.as_manager()
+    counter_field = 'favorites_count'
+
+    class Meta:
+        # The unique (user, recipe) index also serves lookups by user alone
+        # and the (recipe, user) index serves lookups by recipe, so the
+        # foreign keys do not need indexes of their own.
+        constraints = (models.UniqueConstraint(
+            fields=('user', 'recipe'),
+            name='unique_favorite'
+        ),
+        )
+        indexes = (models.Index(
+            fields=('recipe', 'user'),
+            name='favorite_recipe_user_idx'
+        ),
+        )
+
     def __str__(self):
         return f'{self.user} likes {self.recipe}'
 
@@ -99,10 +387,180 @@ class ShoppingCart(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='shopping_carts'
+        related_name='shopping_carts',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
-        related_name='shopping_carts'
+        related_name='shopping_carts',
+        db_index=False
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        db_index=True
+    )
+
+    objects = UserRecipeQuerySet.as_manager()
+    counter_field = 'in_carts_count'
+
+    class Meta:
+        constraints = (models.UniqueConstraint(
+            fields=('user', 'recipe'),
+            name='unique_shopping_cart'
+        ),
+        )
+        indexes = (models.Index(
+            fields=('recipe', 'user'),
+            name='shopping_cart_recipe_user_idx'
+        ),
+        )
+
+
+class RecipeScore(models.Model):
+    """Precomputed ranking of a recipe, refreshed by refresh_scores."""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score'
+    )
+    popularity = models.FloatField('Популярность', default=0)
+    trending = models.FloatField('Популярность за период', default=0)
+    updated_at = models.DateTimeField(
+        'Дата пересчёта',
+        null=True,
+        db_index=True
+    )
+
+    class Meta:
+        # The recipe breaks ties, so ordering reads the index in order.
+        indexes = (
+            models.Index(
+                fields=('popularity', 'recipe'),
+                name='score_popularity_idx'
+            ),
+            models.Index(
+                fields=('trending', 'recipe'),
+                name='score_trending_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe}: {self.popularity}/{self.trending}'
+
+
+def quoted_column(connection, model, name):
+    return connection.ops.quote_name(model._meta.get_field(name).column)
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    """Copies recipes to the timelines of the authors' followers.
+
+    A copy is a single INSERT ... SELECT however many followers an author
+    has. Authors with FEED_FANOUT_LIMIT followers or more are skipped, the
+    limit being checked in the same statement; RecipeQuerySet.feed reads
+    their recipes directly.
+    """
+
+    @property
+    def _write_db(self):
+        return self._db or router.db_for_write(self.model)
+
+    def _copy(self, where, params):
+        connection = connections[self._write_db]
+        ops = connection.ops
+        columns = ', '.join(
+            quoted_column(connection, self.model, name)
+            for name in ('user', 'recipe', 'author')
+        )
+        recipe_id = f'r.{quoted_column(connection, Recipe, "id")}'
+        author_id = f'r.{quoted_column(connection, Recipe, "author")}'
+        sql = (
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{ops.quote_name(self.model._meta.db_table)} ({columns}) '
+            f'SELECT f.{quoted_column(connection, Follow, "user")}, '
+            f'{recipe_id}, {author_id} '
+            f'FROM {ops.quote_name(Follow._meta.db_table)} f '
+            f'JOIN {ops.quote_name(Recipe._meta.db_table)} r ON {author_id} '
+            f'= f.{quoted_column(connection, Follow, "following")} '
+            f'JOIN {ops.quote_name(User._meta.db_table)} a '
+            f'ON a.{quoted_column(connection, User, "id")} = {author_id} '
+            f'WHERE a.{quoted_column(connection, User, "followers_count")} '
+            f'< %s AND {where} '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [settings.FEED_FANOUT_LIMIT, *params])
+            return cursor.rowcount
+
+    def fan_out(self, recipe):
+        """Adds a published recipe to the timelines of all followers."""
+        connection = connections[self._write_db]
+        return self._copy(
+            f'r.{quoted_column(connection, Recipe, "id")} = %s',
+            [recipe.pk]
+        )
+
+    def backfill(self, author_id, limit, user_id=None):
+        """Adds the latest ``limit`` recipes of the author to the timelines.
+
+        Only the timeline of ``user_id`` is filled if it is given, as when
+        the user has just followed the author.
+        """
+        connection = connections[self._write_db]
+        recipe_id = quoted_column(connection, Recipe, 'id')
+        author_id_column = quoted_column(connection, Recipe, 'author')
+        where = (
+            f'r.{author_id_column} = %s AND r.{recipe_id} IN ('
+            f'SELECT {recipe_id} '
+            f'FROM {connection.ops.quote_name(Recipe._meta.db_table)} '
+            f'WHERE {author_id_column} = %s '
+            f'ORDER BY {recipe_id} DESC LIMIT %s)'
+        )
+        params = [author_id, author_id, limit]
+        if user_id is not None:
+            where += f' AND f.{quoted_column(connection, Follow, "user")} = %s'
+            params.append(user_id)
+        return self._copy(where, params)
+
+
+class FeedEntry(models.Model):
+    """A recipe in the following feed of a user (see FeedEntryQuerySet)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        db_index=False
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False
+    )
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        # The unique (user, recipe) index serves reading a timeline, the
+        # (author, user) index removing an author from it on unfollow.
+        constraints = (models.UniqueConstraint(
+            fields=('user', 'recipe'),
+            name='unique_feed_entry'
+        ),
+        )
+        indexes = (models.Index(
+            fields=('author', 'user'),
+            name='feed_entry_author_user_idx'
+        ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
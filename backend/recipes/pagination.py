@@ -1,6 +1,103 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class CustomCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+
+class RecipePagination(CustomPagination):
+    """Page-number pagination with an opt-in keyset (cursor) mode.
+
+    ``?pagination=cursor`` switches to ``CustomCursorPagination``: pages are
+    fetched with ``WHERE id < <cursor>`` instead of an ``OFFSET``, so deep
+    pages cost the same as the first one, and no ``COUNT(*)`` is issued.
+    The ``next``/``previous`` links keep the mode and carry the cursor.
+    Cursor mode always orders by ``-id``.
+    """
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        is_cursor_mode = (
+            request.query_params.get(self.mode_query_param)
+            == self.cursor_mode
+            or CustomCursorPagination.cursor_query_param
+            in request.query_params
+        )
+        if not is_cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_paginator = CustomCursorPagination()
+        return self.cursor_paginator.paginate_queryset(
+            queryset,
+            request,
+            view
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(BasePagination):
+    """Keyset pagination over recipe ids for pages the view fetches itself.
+
+    ``paginate_ids`` asks ``fetch(before, limit)`` for one id more than
+    the page size, below the ``?cursor=`` id; the extra id tells whether
+    a next page exists, and the last id of the page becomes its cursor.
+    Only a ``next`` link is given.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        limit = request.query_params.get(self.page_size_query_param, '')
+        return int(limit) if limit.isdigit() and int(limit) else self.page_size
+
+    def get_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        if not cursor.isdigit():
+            raise NotFound(self.invalid_cursor_message)
+        return int(cursor)
+
+    def paginate_ids(self, fetch, request):
+        self.request = request
+        limit = self.get_page_size(request)
+        ids = fetch(self.get_cursor(request), limit + 1)
+        self.next_cursor = ids[limit - 1] if len(ids) > limit else None
+        return ids[:limit]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('results', data),
+        )))
@@ -0,0 +1,121 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import (Count, Exists, ExpressionWrapper, F,
+                              FloatField, Max, OuterRef, Q, Subquery)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Favorite, Recipe, RecipeScore, ShoppingCart
+
+FAVORITE_WEIGHT = 1
+SHOPPING_CART_WEIGHT = 2
+TRENDING_DAYS = 7
+BATCH_SIZE = 1000
+
+
+def count_subquery(model, field, **filters):
+    """Counts rows of model pointing at the outer row through field."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')},
+            **filters
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+def get_popularity():
+    return ExpressionWrapper(
+        F('favorites_count') * FAVORITE_WEIGHT
+        + F('in_carts_count') * SHOPPING_CART_WEIGHT,
+        output_field=FloatField()
+    )
+
+
+def get_trending(since):
+    return ExpressionWrapper(
+        count_subquery(Favorite, 'recipe', created__gte=since)
+        * FAVORITE_WEIGHT
+        + count_subquery(ShoppingCart, 'recipe', created__gte=since)
+        * SHOPPING_CART_WEIGHT,
+        output_field=FloatField()
+    )
+
+
+def get_stale_recipes(last_refresh, window_start, days):
+    """Selects recipes whose scores may have changed since last_refresh.
+
+    These are recipes without a score, recipes whose popularity no longer
+    matches the counters, recipes with new activity, and recipes whose
+    activity has dropped out of the trending window since then.
+    """
+    previous_window_start = last_refresh - timedelta(days=days)
+    activity = Q(created__gte=last_refresh) | Q(created__range=(
+        previous_window_start,
+        window_start
+    ))
+    return Recipe.objects.annotate(
+        expected_popularity=get_popularity(),
+        favorites_active=Exists(Favorite.objects.filter(
+            activity,
+            recipe=OuterRef('pk')
+        )),
+        shopping_carts_active=Exists(ShoppingCart.objects.filter(
+            activity,
+            recipe=OuterRef('pk')
+        ))
+    ).filter(
+        Q(score__isnull=True)
+        | ~Q(score__popularity=F('expected_popularity'))
+        | Q(favorites_active=True)
+        | Q(shopping_carts_active=True)
+    ).values('pk')
+
+
+def refresh_scores(full=False, days=TRENDING_DAYS):
+    """Refreshes RecipeScore rows and returns the number of rows written.
+
+    Unless full is set, only the recipes picked by get_stale_recipes since
+    the previous refresh are recomputed.
+    """
+    now = timezone.now()
+    window_start = now - timedelta(days=days)
+    recipes = Recipe.objects.all()
+    last_refresh = RecipeScore.objects.aggregate(
+        last=Max('updated_at')
+    )['last']
+    if not full and last_refresh is not None:
+        recipes = recipes.filter(
+            pk__in=get_stale_recipes(last_refresh, window_start, days)
+        )
+    scores = recipes.annotate(
+        popularity=get_popularity(),
+        trending=get_trending(window_start)
+    ).values_list('pk', 'popularity', 'trending')
+    written = 0
+    with transaction.atomic():
+        if full:
+            RecipeScore.objects.all().delete()
+        batch = []
+        for pk, popularity, trending in scores.iterator():
+            batch.append(RecipeScore(
+                recipe_id=pk,
+                popularity=popularity,
+                trending=trending,
+                updated_at=now
+            ))
+            if len(batch) == BATCH_SIZE:
+                written += save_scores(batch)
+                batch = []
+        written += save_scores(batch)
+    return written
+
+
+def save_scores(scores):
+    RecipeScore.objects.filter(
+        recipe_id__in=[score.recipe_id for score in scores]
+    ).delete()
+    RecipeScore.objects.bulk_create(scores)
+    return len(scores)
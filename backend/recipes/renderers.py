@@ -0,0 +1,94 @@
+from django.http import StreamingHttpResponse
+from rest_framework import renderers
+
+from .shopping_list import render_csv, render_json, render_pdf, render_txt
+
+PDF_BLOCK_SIZE = 8192
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Base renderer for the aggregated shopping list.
+
+    Successful downloads are streamed by ``get_response``; ``render`` is
+    only reached for error responses, which keep the API's JSON format.
+    """
+    charset = 'utf-8'
+    filename = 'shopping_list'
+
+    def stream(self, ingredients):
+        raise NotImplementedError
+
+    def get_content(self, ingredients):
+        """Yields the rendered document as chunks of bytes."""
+        for chunk in self.stream(ingredients):
+            yield chunk.encode(self.charset)
+
+    def get_content_type(self):
+        if self.charset is None:
+            return self.media_type
+        return f'{self.media_type}; charset={self.charset}'
+
+    def get_filename(self):
+        return f'{self.filename}.{self.format}'
+
+    def get_response(self, content):
+        response = StreamingHttpResponse(
+            content,
+            content_type=self.get_content_type()
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.get_filename()}"'
+        )
+        return response
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        response = renderer_context.get('response')
+        if response is not None and response.exception:
+            json_renderer = renderers.JSONRenderer()
+            response['Content-Type'] = json_renderer.media_type
+            return json_renderer.render(data, accepted_media_type,
+                                        renderer_context)
+        return b''.join(self.get_content(data))
+
+
+class PlainTextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        return render_txt(ingredients)
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        return render_csv(ingredients)
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, ingredients):
+        return render_json(ingredients)
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def get_content(self, ingredients):
+        with render_pdf(ingredients) as output:
+            yield from iter(lambda: output.read(PDF_BLOCK_SIZE), b'')
+
+
+SHOPPING_LIST_RENDERERS = (
+    PlainTextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    JSONShoppingListRenderer,
+    PDFShoppingListRenderer,
+)
@@ -0,0 +1,133 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+WORD_RE = re.compile(r'\w+')
+MAX_WORDS = 10
+FTS_TABLE = 'recipes_recipe_fts'
+
+POSTGRES_INDEX_SQL = (
+    'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    """
+    CREATE OR REPLACE FUNCTION {table}_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := setweight(
+            to_tsvector('{config}', coalesce(NEW.name, '')), 'A'
+        ) || setweight(
+            to_tsvector('{config}', coalesce(NEW.text, '')), 'B'
+        );
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}',
+    """
+    CREATE TRIGGER {table}_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON {table}
+    FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update()
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS {table}_search_vector_idx
+    ON {table} USING gin (search_vector)
+    """,
+    'UPDATE {table} SET name = name WHERE search_vector IS NULL',
+)
+SQLITE_INDEX_SQL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+        name, text, content='{table}', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+        INSERT INTO {fts}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {fts}_update
+    AFTER UPDATE OF name, text ON {table} BEGIN
+        INSERT INTO {fts}({fts}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {fts}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+)
+
+
+def install_search_index(sender, using, **kwargs):
+    """Creates the full-text index of recipes and the triggers keeping it.
+
+    Runs after migrate. The index lives outside the models: a tsvector
+    column with a GIN index on PostgreSQL and an FTS5 table on SQLite, both
+    maintained by triggers on every insert and update of a recipe.
+    """
+    connection = connections[using]
+    statements = {
+        'postgresql': POSTGRES_INDEX_SQL,
+        'sqlite': SQLITE_INDEX_SQL,
+    }.get(connection.vendor, ())
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement.format(
+                table=Recipe._meta.db_table,
+                fts=FTS_TABLE,
+                config=settings.SEARCH_CONFIG
+            ))
+
+
+def search_recipes(queryset, query):
+    """Filters recipes matching every word of the query by prefix.
+
+    Results are annotated with search_rank and ordered by it, the name
+    weighing more than the description.
+    """
+    words = WORD_RE.findall(query.lower())[:MAX_WORDS]
+    if not words:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    table = Recipe._meta.db_table
+    if vendor == 'postgresql':
+        params = (
+            settings.SEARCH_CONFIG,
+            ' & '.join(f'{word}:*' for word in words)
+        )
+        where_sql = f'{table}.search_vector @@ to_tsquery(%s::regconfig, %s)'
+        rank_sql = (
+            f'ts_rank({table}.search_vector, to_tsquery(%s::regconfig, %s))'
+        )
+    elif vendor == 'sqlite':
+        params = (' '.join(f'"{word}"*' for word in words), )
+        where_sql = (
+            f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        )
+        rank_sql = (
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id'
+        )
+    else:
+        for word in words:
+            queryset = queryset.filter(name__icontains=word)
+        return queryset
+    # Django 2.2 cannot filter by a raw boolean expression, hence extra().
+    return queryset.extra(
+        where=(where_sql, ),
+        params=params
+    ).annotate(
+        search_rank=RawSQL(rank_sql, params, output_field=FloatField())
+    ).order_by('-search_rank', '-id')
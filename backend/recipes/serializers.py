@@ -1,9 +1,13 @@
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
+from foodgram.metrics import TimedSerializerMixin
+from foodgram.sparse import SparseFieldsetMixin
 from rest_framework import exceptions, serializers
 from users.models import Follow, User
 from users.serializers import CustomUserSerializer
 
+from .cache import invalidate_recipe_carts
+from .fields import StreamingBase64ImageField
+from .images import get_image_variants
 from .models import (Ingredient, Favorite, Recipe, RecipeIngredients,
                      ShoppingCart, Tag)
 
@@ -12,15 +16,17 @@ RECIPE_COOKING_TIME_ERR_MSG = 'Укажите корректное время п
 RECIPE_INGREDIENTS_ERR_MSG = ('Нельзя указывать один и тот же ингредиент более'
                               ' одного раза')
 INGREDIENT_AMOUNT_ERR_MSG = 'Количество ингредиента должно быть больше нуля.'
+INGREDIENT_NOT_FOUND_ERR_MSG = 'Указан несуществующий ингредиент.'
+RECIPE_IDS_MAX_LENGTH = 100
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
@@ -50,7 +56,19 @@ class RecipeIngredientsSerializerForWrite(serializers.ModelSerializer):
         ]
 
 
-class RecipeSerializerForRead(serializers.ModelSerializer):
+class RecipeSerializerForRead(SparseFieldsetMixin, TimedSerializerMixin,
+                              serializers.ModelSerializer):
+    compact_fields = {
+        'author': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'tags': lambda: serializers.PrimaryKeyRelatedField(
+            many=True,
+            read_only=True
+        ),
+        'ingredients': lambda: serializers.PrimaryKeyRelatedField(
+            many=True,
+            read_only=True
+        ),
+    }
     tags = TagSerializer(many=True)
     author = CustomUserSerializer()
     ingredients = RecipeIngredientsSerializerForRead(
@@ -59,6 +77,7 @@ class RecipeSerializerForRead(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -70,29 +89,38 @@ class RecipeSerializerForRead(serializers.ModelSerializer):
                   'is_in_shopping_cart',
                   'name',
                   'image',
+                  'image_variants',
                   'text',
                   'cooking_time')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_anonymous:
             return False
         return Favorite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_anonymous:
             return False
         return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj, self.context.get('request'))
 
-class RecipeSerializerForWrite(serializers.ModelSerializer):
+
+class RecipeSerializerForWrite(TimedSerializerMixin,
+                               serializers.ModelSerializer):
     ingredients = RecipeIngredientsSerializerForWrite(many=True)
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True
     )
-    image = Base64ImageField(max_length=False, use_url=True)
+    image = StreamingBase64ImageField(max_length=False, use_url=True)
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
@@ -119,8 +147,53 @@ class RecipeSerializerForWrite(serializers.ModelSerializer):
             set_of_ingredients_id.add(ingredient['id'])
             if ingredient['amount'] <= 0:
                 raise exceptions.ValidationError(INGREDIENT_AMOUNT_ERR_MSG)
+        existing_ids = Ingredient.objects.filter(
+            id__in=set_of_ingredients_id
+        ).values_list('id', flat=True)
+        if set_of_ingredients_id - set(existing_ids):
+            raise exceptions.ValidationError(INGREDIENT_NOT_FOUND_ERR_MSG)
         return ingredients
 
+    def update_ingredients(self, recipe, ingredients_data):
+        """Writes only the difference between stored and submitted rows.
+
+        Returns whether anything has changed.
+        """
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients_data
+        }
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        removed = existing.keys() - amounts.keys()
+        changed = []
+        for ingredient_id, recipe_ingredient in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        added = [
+            RecipeIngredients(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        if removed:
+            recipe.recipe_ingredients.filter(
+                ingredient_id__in=removed
+            ).delete()
+        if changed:
+            RecipeIngredients.objects.bulk_update(changed, ('amount',))
+        if added:
+            RecipeIngredients.objects.bulk_create(added)
+        return bool(removed or changed or added)
+
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
@@ -129,21 +202,18 @@ class RecipeSerializerForWrite(serializers.ModelSerializer):
         if Recipe.objects.filter(name=name, author=author).exists():
             raise exceptions.ValidationError(RECIPE_NAME_ERR_MSG)
         new_recipe = Recipe.objects.create(**validated_data)
-        for tag in tags_data:
-            id = tag.id
-            tag_object = get_object_or_404(Tag, id=id)
-            new_recipe.tags.add(tag_object)
-        for ingredient in ingredients_data:
-            id = ingredient.get('id')
-            amount = ingredient.get('amount')
-            ingredient_object = get_object_or_404(Ingredient, id=id)
-            new_recipe.ingredients.add(
-                ingredient_object,
-                through_defaults={'amount': amount}
+        new_recipe.tags.set(tags_data)
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(
+                recipe=new_recipe,
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
             )
-        new_recipe.save()
+            for ingredient in ingredients_data
+        )
         return new_recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         instance.name = self.initial_data.get('name', instance.name)
         instance.cooking_time = validated_data.get(
@@ -152,44 +222,56 @@ class RecipeSerializerForWrite(serializers.ModelSerializer):
         )
         instance.image = validated_data.get('image', instance.image)
         instance.text = validated_data.get('text', instance.text)
-        tags_data = validated_data.pop('tags')
-        ingredients_data = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.ingredients.clear()
-        for tag in tags_data:
-            tag_id = tag.id
-            tag_object = get_object_or_404(Tag, id=tag_id)
-            instance.tags.add(tag_object)
-        for ingredient in ingredients_data:
-            ingredient_id = ingredient.get('id')
-            amount = ingredient.get('amount')
-            ingredient_object = get_object_or_404(Ingredient, id=ingredient_id)
-            instance.ingredients.add(
-                ingredient_object,
-                through_defaults={'amount': amount}
-            )
+        tags_data = validated_data.pop('tags', None)
+        ingredients_data = validated_data.pop('ingredients', None)
         instance.save()
+        if tags_data is not None:
+            instance.tags.set(tags_data)
+        if (ingredients_data is not None
+                and self.update_ingredients(instance, ingredients_data)):
+            invalidate_recipe_carts(instance)
         return instance
 
     def to_representation(self, instance):
         serializer = RecipeSerializerForRead(
-            instance,
+            Recipe.objects.for_read(
+                self.context['request'].user
+            ).get(pk=instance.pk),
             context=self.context
         )
         return serializer.data
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj, self.context.get('request'))
 
-class SubscribeUserSerializer(serializers.ModelSerializer):
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Validates a batch of recipe ids for the favorite and cart actions."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_IDS_MAX_LENGTH
+    )
+
+
+class SubscribeUserSerializer(SparseFieldsetMixin, TimedSerializerMixin,
+                              serializers.ModelSerializer):
     """Represents serializer for following users."""
+    compact_fields = {
+        'recipes': lambda: serializers.SerializerMethodField(
+            'get_recipe_ids'
+        ),
+    }
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -197,19 +279,28 @@ class SubscribeUserSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         if user.is_anonymous:
             return False
         return Follow.objects.filter(user=user,
                                      following=obj).exists()
 
-    def get_recipes(self, obj):
+    def get_recipes_preview(self, obj):
+        if hasattr(obj, 'recipes_preview'):
+            return obj.recipes_preview
         limit = self.context['request'].query_params.get('recipes_limit')
-        if limit is None:
-            recipes = obj.recipes.all()
-        else:
-            recipes = obj.recipes.all()[:int(limit)]
-        return ShortRecipeSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        recipes = obj.recipes.order_by('-id')
+        if limit and limit.isdigit():
+            return recipes[:int(limit)]
+        return recipes
+
+    def get_recipes(self, obj):
+        return ShortRecipeSerializer(
+            self.get_recipes_preview(obj),
+            many=True
+        ).data
+
+    def get_recipe_ids(self, obj):
+        return [recipe.pk for recipe in self.get_recipes_preview(obj)]
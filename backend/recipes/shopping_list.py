@@ -0,0 +1,95 @@
+import csv
+import json
+import tempfile
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'DejaVuSerif'
+FONT_FILE = 'DejaVuSerif.ttf'
+TITLE = 'Список покупок:'
+TITLE_FONT_SIZE = 18
+LINE_FONT_SIZE = 14
+LEFT_MARGIN = 100
+RIGHT_MARGIN = 500
+TOP = 800
+BOTTOM = 50
+LINE_HEIGHT = 20
+# Rendered documents larger than this are spilled from memory to disk.
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def register_fonts():
+    """Parses and registers the PDF font on the first PDF rendered.
+
+    Registering lazily keeps a missing font from breaking anything but the
+    PDF download.
+    """
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_FILE))
+
+
+def format_ingredient(ingredient):
+    return (f'{ingredient["name"]}({ingredient["measurement_unit"]}) - '
+            f'{ingredient["amount"]}')
+
+
+class Echo:
+    """File-like object that hands written rows back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(ingredients):
+    yield f'{TITLE}\n'
+    for i, ingredient in enumerate(ingredients, start=1):
+        yield f'{i}. {format_ingredient(ingredient)}\n'
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['name'],
+            ingredient['measurement_unit'],
+            ingredient['amount']
+        ))
+
+
+def render_json(ingredients):
+    yield '['
+    for i, ingredient in enumerate(ingredients):
+        separator = ',' if i else ''
+        yield separator + json.dumps(ingredient, ensure_ascii=False)
+    yield ']'
+
+
+def render_pdf(ingredients):
+    """Renders aggregated ingredients into a paginated PDF.
+
+    Returns a file object positioned at the start of the document, ready
+    to be streamed to the client block by block.
+    """
+    register_fonts()
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    p = canvas.Canvas(output, pagesize=A4)
+    p.setFont(FONT_NAME, TITLE_FONT_SIZE)
+    p.drawString(LEFT_MARGIN, TOP, TITLE)
+    p.line(LEFT_MARGIN, TOP - 15, RIGHT_MARGIN, TOP - 15)
+    p.setFont(FONT_NAME, LINE_FONT_SIZE)
+    y = TOP - 50
+    for i, ingredient in enumerate(ingredients, start=1):
+        if y < BOTTOM:
+            p.showPage()
+            p.setFont(FONT_NAME, LINE_FONT_SIZE)
+            y = TOP
+        p.drawString(LEFT_MARGIN, y, f'{i}. {format_ingredient(ingredient)}')
+        y -= LINE_HEIGHT
+    p.showPage()
+    p.save()
+    output.seek(0)
+    return output
@@ -0,0 +1,131 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from users.models import Follow, User
+from users.signals import change_counter
+
+from .cache import (INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY,
+                    invalidate_author_versions, invalidate_cart_versions,
+                    invalidate_recipe_carts, invalidate_versions)
+from .images import delete_image_variants, schedule_image_variants
+from .models import (Favorite, FeedEntry, Ingredient, Recipe,
+                     RecipeIngredients, RecipeScore, ShoppingCart, Tag,
+                     relations_changed)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    invalidate_versions((INGREDIENTS_VERSION_KEY,))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    invalidate_versions((TAGS_VERSION_KEY,))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredients)
+def touch_recipe(sender, instance, **kwargs):
+    # Rows edited on their own (e.g. in the admin) do not save the recipe,
+    # whose updated_at versions its cached detail.
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        updated_at=timezone.now()
+    )
+    invalidate_recipe_carts(instance.recipe_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, created, update_fields, **kwargs):
+    # Logging in only touches last_login, which recipes do not show.
+    if not created and update_fields != {'last_login'}:
+        invalidate_author_versions((instance.pk,))
+
+
+@receiver(relations_changed)
+def update_relation_counters(sender, recipe_ids, delta, **kwargs):
+    change_counter(Recipe, recipe_ids, sender.counter_field, delta)
+
+
+@receiver(relations_changed, sender=ShoppingCart)
+def invalidate_shopping_cart(sender, user_id, **kwargs):
+    invalidate_cart_versions((user_id,))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def relation_saved(sender, instance, created, **kwargs):
+    if created:
+        relations_changed.send(
+            sender=sender,
+            user_id=instance.user_id,
+            recipe_ids=(instance.recipe_id,),
+            delta=1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def relation_deleted(sender, instance, **kwargs):
+    relations_changed.send(
+        sender=sender,
+        user_id=instance.user_id,
+        recipe_ids=(instance.recipe_id,),
+        delta=-1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, (instance.author_id,), 'recipes_count', 1)
+
+
+@receiver(post_save, sender=Recipe)
+def create_score(sender, instance, created, **kwargs):
+    # A zero score until refresh_scores runs keeps new recipes in the
+    # ranked listings, which only join recipes that have a score.
+    if created:
+        RecipeScore.objects.create(recipe=instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    change_counter(User, (instance.author_id,), 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    if instance.image and instance.image.name != instance.variants_image:
+        schedule_image_variants(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image_variants(sender, instance, **kwargs):
+    name = instance.variants_image
+    if name:
+        transaction.on_commit(lambda: delete_image_variants(name))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        FeedEntry.objects.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        FeedEntry.objects.backfill(
+            instance.following_id,
+            settings.FEED_BACKFILL_LIMIT,
+            user_id=instance.user_id
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def trim_feed(sender, instance, **kwargs):
+    FeedEntry.objects.filter(
+        author_id=instance.following_id,
+        user_id=instance.user_id
+    ).delete()
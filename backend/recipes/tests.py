@@ -0,0 +1,481 @@
+import base64
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+from .cache import INGREDIENTS_VERSION_KEY, get_cart_version, get_version
+from .images import get_variant_path
+from .ingredient_index import IngredientIndex
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredients,
+                     ShoppingCart, Tag)
+from .permissions import IsAuthorOrAdminOrReadOnlyPermission
+from .ranking import refresh_scores
+from .serializers import RECIPE_IDS_MAX_LENGTH
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        first_name=username,
+        last_name=username,
+        password='secret-password'
+    )
+
+
+TEST_IMAGE = 'recipes/test.png'
+
+
+def make_image(size=(2, 2)):
+    output = BytesIO()
+    Image.new('RGB', size).save(output, 'PNG')
+    return output.getvalue()
+
+
+def encode_image(size=(2, 2)):
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(make_image(size)).decode()
+    )
+
+
+def create_recipes(author, count, tags, ingredients):
+    recipes = []
+    for index in range(count):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f'{author.username} {index}',
+            image=TEST_IMAGE,
+            text='Описание',
+            cooking_time=10
+        )
+        recipe.tags.set(tags)
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tags = [
+            Tag.objects.create(name=f'Тег {index}', color=f'#00000{index}',
+                               slug=f'tag{index}')
+            for index in range(3)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(5)
+        ]
+        self.user = create_user('reader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+@override_settings(IMAGE_WORKERS=0)
+class MediaTestCase(TransactionTestCase):
+    """Keeps uploads in a temporary MEDIA_ROOT that holds TEST_IMAGE.
+
+    Image variants are built on commit, synchronously, from a real file.
+    """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        default_storage.save(TEST_IMAGE, ContentFile(make_image()))
+
+
+class QueryCountTests(APITestCase):
+    """Reads cost a fixed number of queries whatever the page size."""
+
+    def setUp(self):
+        super().setUp()
+        self.authors = [create_user(f'author{index}') for index in range(8)]
+        for author in self.authors:
+            Follow.objects.create(user=self.user, following=author)
+            recipes = create_recipes(
+                author,
+                3,
+                self.tags,
+                self.ingredients
+            )
+            Favorite.objects.create(user=self.user, recipe=recipes[0])
+
+    def test_recipe_list(self):
+        for limit in (2, 20):
+            with self.subTest(limit=limit):
+                # Count, recipes, authors, tags, ingredients.
+                with self.assertNumQueries(5):
+                    response = self.client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_recipe_detail(self):
+        recipes = (
+            create_recipes(self.user, 1, self.tags[:1], self.ingredients[:1])
+            + create_recipes(self.user, 1, self.tags, self.ingredients)
+        )
+        for recipe in recipes:
+            with self.subTest(recipe=recipe.pk):
+                cache.clear()
+                # Version and flags, recipe, author, tags, ingredients.
+                with self.assertNumQueries(5):
+                    response = self.client.get(f'/api/recipes/{recipe.pk}/')
+                self.assertEqual(response.status_code, 200)
+
+    def test_subscriptions(self):
+        for limit in (2, 8):
+            with self.subTest(limit=limit):
+                # Count, authors, recipe previews.
+                with self.assertNumQueries(3):
+                    response = self.client.get(
+                        f'/api/users/subscriptions/?limit={limit}'
+                        f'&recipes_limit=2'
+                    )
+                self.assertEqual(len(response.data['results']), limit)
+                self.assertEqual(
+                    len(response.data['results'][0]['recipes']),
+                    2
+                )
+
+
+class RelationBatchTests(MediaTestCase):
+    """Batch favorite and shopping cart endpoints; the cart version is
+    dropped on commit, so TestCase would never see it change."""
+
+    relations = (
+        ('/api/recipes/favorite/', Favorite, 'favorites_count'),
+        ('/api/recipes/shopping_cart/', ShoppingCart, 'in_carts_count'),
+    )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = create_user('reader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe_ids = [
+            recipe.pk
+            for recipe in create_recipes(create_user('author'), 3, (), ())
+        ]
+
+    def counts(self, field):
+        return dict(Recipe.objects.values_list('pk', field))
+
+    def test_add_and_remove(self):
+        first, second, third = self.recipe_ids
+        for url, model, field in self.relations:
+            with self.subTest(url=url):
+                response = self.client.post(
+                    url, {'recipes': [first, second]}, format='json'
+                )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(
+                    [recipe['id'] for recipe in response.json()],
+                    [second, first]
+                )
+                # Duplicates in the request and existing relations are
+                # skipped, only the new recipe is returned.
+                response = self.client.post(
+                    url,
+                    {'recipes': [first, third, third]},
+                    format='json'
+                )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(
+                    [recipe['id'] for recipe in response.json()], [third]
+                )
+                self.assertEqual(
+                    self.counts(field), {first: 1, second: 1, third: 1}
+                )
+                response = self.client.delete(
+                    url, {'recipes': [first, second]}, format='json'
+                )
+                self.assertEqual(response.status_code, 204)
+                self.assertEqual(
+                    self.counts(field), {first: 0, second: 0, third: 1}
+                )
+                self.assertEqual(
+                    list(model.objects.values_list('recipe', flat=True)),
+                    [third]
+                )
+
+    def test_nothing_changed(self):
+        first = self.recipe_ids[0]
+        for url, model, field in self.relations:
+            with self.subTest(url=url):
+                model.objects.add(self.user, (first, ))
+                for method, recipe_ids in (
+                    (self.client.post, [first]),
+                    (self.client.post, [max(self.recipe_ids) + 1]),
+                    (self.client.delete, [self.recipe_ids[1]]),
+                ):
+                    response = method(
+                        url, {'recipes': recipe_ids}, format='json'
+                    )
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('errors', response.json())
+                self.assertEqual(self.counts(field)[first], 1)
+
+    def test_invalid_ids_rejected(self):
+        too_many = list(range(1, RECIPE_IDS_MAX_LENGTH + 2))
+        for url, model, field in self.relations:
+            for recipe_ids in (['abc'], [0], [], too_many):
+                with self.subTest(url=url, recipes=recipe_ids[:2]):
+                    response = self.client.post(
+                        url, {'recipes': recipe_ids}, format='json'
+                    )
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('recipes', response.json())
+            self.assertFalse(model.objects.exists())
+        response = self.client.post(
+            '/api/recipes/favorite/', {'recipes': ['abc']}, format='json'
+        )
+        self.assertIn('0', response.json()['recipes'])
+
+    def test_cart_version_changes(self):
+        url = '/api/recipes/shopping_cart/'
+        data = {'recipes': self.recipe_ids}
+        version = get_cart_version(self.user.pk)
+        self.client.post(url, data, format='json')
+        added = get_cart_version(self.user.pk)
+        self.assertNotEqual(added, version)
+        self.client.post(url, data, format='json')
+        self.assertEqual(get_cart_version(self.user.pk), added)
+        self.client.delete(url, data, format='json')
+        self.assertNotEqual(get_cart_version(self.user.pk), added)
+
+
+class RecipeDetailTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe, = create_recipes(self.user, 1, self.tags, ())
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def test_no_last_modified(self):
+        for client in (self.client, APIClient()):
+            self.assertNotIn('Last-Modified', client.get(self.url))
+
+    def test_head(self):
+        for url in ('/api/recipes/', self.url, '/api/recipes/?fields=id'):
+            with self.subTest(url=url):
+                response = self.client.head(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, b'')
+
+    def test_object_permissions_checked(self):
+        with mock.patch.object(
+            IsAuthorOrAdminOrReadOnlyPermission,
+            'has_object_permission',
+            return_value=False
+        ):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+
+class RecipeRevalidationTests(MediaTestCase):
+    """Cached details change with whatever their representation shows."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.author = create_user('cook')
+        self.tag = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                      slug='breakfast')
+        self.ingredient = Ingredient.objects.create(name='Мука',
+                                                    measurement_unit='г')
+        self.recipe, = create_recipes(
+            self.author,
+            1,
+            (self.tag, ),
+            (self.ingredient, )
+        )
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.client = APIClient()
+        self.etag = self.client.get(self.url)['ETag']
+
+    def revalidate(self):
+        return self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+
+    def test_author_and_tag_renamed(self):
+        self.assertEqual(self.revalidate().status_code, 304)
+        self.author.first_name = 'Повар'
+        self.author.save()
+        self.tag.name = 'Обед'
+        self.tag.save()
+        for response in (
+            self.revalidate(),
+            self.client.get(
+                self.url,
+                HTTP_IF_MODIFIED_SINCE='Sat, 01 Jan 2050 00:00:00 GMT'
+            ),
+        ):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['author']['first_name'], 'Повар')
+            self.assertEqual(response.data['tags'][0]['name'], 'Обед')
+
+    def test_recipe_ingredient_edited(self):
+        recipe_ingredient = RecipeIngredients.objects.get(recipe=self.recipe)
+        recipe_ingredient.amount = 250
+        recipe_ingredient.save()
+        response = self.revalidate()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ingredients'][0]['amount'], 250)
+
+
+class RankingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipes = create_recipes(self.user, 3, self.tags[:1], ())
+        refresh_scores(full=True)
+
+    def test_only_stale_recipes_refreshed(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[1])
+        self.assertEqual(refresh_scores(), 1)
+        self.assertEqual(refresh_scores(), 0)
+
+    def test_ordering_includes_new_recipes(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        refresh_scores()
+        recipe, = create_recipes(self.user, 1, self.tags[:1], ())
+        response = self.client.get('/api/recipes/?ordering=popular')
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.recipes[0].pk, recipe.pk, self.recipes[2].pk,
+             self.recipes[1].pk]
+        )
+
+
+class InvalidationTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = create_user('cook')
+        self.recipe, = create_recipes(self.user, 1, (), ())
+
+    def test_cart_version_dropped_on_commit(self):
+        version = get_cart_version(self.user.pk)
+        with transaction.atomic():
+            ShoppingCart.objects.add(self.user, (self.recipe.pk, ))
+            self.assertEqual(get_cart_version(self.user.pk), version)
+        self.assertNotEqual(get_cart_version(self.user.pk), version)
+
+
+class IngredientIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.index = IngredientIndex()
+        Ingredient.objects.create(name='Мука', measurement_unit='г')
+
+    def search(self, query):
+        return [item['name'] for item in self.index.search(query, 10)]
+
+    def test_lookups_do_not_query_database(self):
+        self.search('му')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('му'), ['Мука'])
+
+    @override_settings(INGREDIENT_INDEX_CHECK_INTERVAL=0)
+    def test_rebuilt_without_shared_version(self):
+        """A save in another process only shows up in the table stamp."""
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        self.search('му')
+        Ingredient.objects.create(name='Мускатный орех', measurement_unit='г')
+        cache.set(INGREDIENTS_VERSION_KEY, version, None)
+        self.assertEqual(self.search('му'), ['Мука', 'Мускатный орех'])
+
+
+class LoaderTests(TestCase):
+    def test_conflicting_tags_skipped(self):
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            for name, content in (
+                ('ingredients', 'Мука,г\n'),
+                ('tags', 'Завтрак,#49B64E,morning\nОбед,#E26C2D,lunch\n'
+                         'Ужин,#8775D2,dinner\n'),
+            ):
+                paths[name] = os.path.join(directory, f'{name}.csv')
+                with open(paths[name], 'w', encoding='utf-8') as file:
+                    file.write(content)
+            output = StringIO()
+            call_command(
+                'loader_csv',
+                '--upsert',
+                ingredients=paths['ingredients'],
+                tags=paths['tags'],
+                stdout=output,
+                stderr=StringIO()
+            )
+        self.assertEqual(
+            sorted(Tag.objects.values_list('slug', flat=True)),
+            ['breakfast', 'dinner']
+        )
+        self.assertIn('пропущено из-за конфликтов 2', output.getvalue())
+
+
+class RecipeImageTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('cook')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                      slug='breakfast')
+        self.ingredient = Ingredient.objects.create(name='Мука',
+                                                    measurement_unit='г')
+
+    def save_recipe(self, url, method, image):
+        return getattr(self.client, method)(url, {
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 100}],
+            'tags': [self.tag.pk],
+            'image': image,
+            'name': 'Блины',
+            'text': 'Описание',
+            'cooking_time': 30,
+        }, format='json')
+
+    def test_old_variants_deleted(self):
+        response = self.save_recipe('/api/recipes/', 'post', encode_image())
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        old_variant = get_variant_path(recipe.image.name, 'card', 'webp')
+        self.assertTrue(default_storage.exists(old_variant))
+        response = self.save_recipe(
+            f'/api/recipes/{recipe.pk}/',
+            'patch',
+            encode_image((4, 4))
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.variants_image, recipe.image.name)
+        self.assertTrue(default_storage.exists(
+            get_variant_path(recipe.image.name, 'card', 'webp')
+        ))
+        self.assertFalse(default_storage.exists(old_variant))
+
+    def test_decompression_bomb_rejected(self):
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 10):
+            response = self.save_recipe(
+                '/api/recipes/',
+                'post',
+                encode_image((4, 4))
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
@@ -1,23 +1,31 @@
-import io
-
-from django.http import FileResponse
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django_filters.rest_framework import DjangoFilterBackend
+from foodgram.db import ReplicaReadMixin
+from foodgram.sparse import SparseFieldsetViewMixin
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import quote_etag
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from .cache import (INGREDIENTS_VERSION_KEY, RECIPE_TIMEOUT, TAGS_VERSION_KEY,
+                    cache_stream, get_cart_version, get_recipe_key,
+                    get_recipe_version, get_shopping_list_key)
 from .filters import IngredientFilter, RecipeFilter
-from .mixins import RetrieveListViewSet
+from .ingredient_index import ingredient_index
+from .mixins import CachedListMixin, RetrieveListViewSet
+from .pagination import RecipePagination
 from .models import (Ingredient, Favorite, Recipe, RecipeIngredients,
                      ShoppingCart, Tag)
 from .permissions import IsAuthorOrAdminOrReadOnlyPermission
-from .serializers import (IngredientSerializer, RecipeSerializerForRead,
-                          RecipeSerializerForWrite, ShortRecipeSerializer,
-                          TagSerializer)
+from .serializers import (IngredientSerializer, RecipeIdsSerializer,
+                          RecipeSerializerForRead, RecipeSerializerForWrite,
+                          ShortRecipeSerializer, TagSerializer)
+from .renderers import SHOPPING_LIST_RENDERERS
 
 SHOPPING_CART_ADD_ERR_MSG = 'Рецепт уже добавлен в шопинг-лист'
 SHOPPING_CART_DELETE_ERR_MSG = 'Рецепт не был добавлен в шопинг-лист'
@@ -25,155 +33,248 @@ FAVORITE_ADD_ERR_MSG = 'Рецепт уже добавлен в избранно
 FAVORITE_DELETE_ERR_MSG = 'Рецепт не был добавлен в избранное'
 
 
-class IngredientViewSet(RetrieveListViewSet):
+class IngredientViewSet(ReplicaReadMixin, CachedListMixin,
+                        RetrieveListViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
+    list_version_key = INGREDIENTS_VERSION_KEY
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return Response(ingredient_index.search(
+            name,
+            settings.INGREDIENT_SEARCH_LIMIT
+        ))
 
 
-class TagViewSet(RetrieveListViewSet):
+class TagViewSet(ReplicaReadMixin, CachedListMixin, RetrieveListViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny, )
+    list_version_key = TAGS_VERSION_KEY
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, SparseFieldsetViewMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all().order_by('-id')
     serializer_class = RecipeSerializerForRead
     permission_classes = (IsAuthorOrAdminOrReadOnlyPermission, )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method in permissions.SAFE_METHODS:
+            return queryset.for_read(
+                self.request.user,
+                self.sparse_fields,
+                self.expand
+            )
+        return queryset
 
     def get_serializer_class(self):
-        if self.request.method == 'GET':
+        if self.request.method in permissions.SAFE_METHODS:
             return RecipeSerializerForRead
         return RecipeSerializerForWrite
 
+    def retrieve(self, request, *args, **kwargs):
+        """Serves the recipe from the cache with the user's flags merged in.
+
+        The representation without the flags is cached per version of the
+        recipe, its tags, ingredients and author. One query fetches the
+        version and the flags, and clients holding the current ETag get
+        304 without the cache being read. Sparse fieldsets are not cached.
+        No Last-Modified is sent: the representation also changes with the
+        author, tags, ingredients and the user's flags, which only the ETag
+        covers.
+        """
+        if self.sparse_fields is not None:
+            return super().retrieve(request, *args, **kwargs)
+        user = request.user
+        pk = kwargs['pk']
+        recipe_id = int(pk) if str(pk).isdigit() else 0
+        state = get_object_or_404(
+            Recipe.objects.with_user_flags(user).with_author_subscribed(
+                user
+            ).only('updated_at', 'author'),
+            pk=recipe_id
+        )
+        self.check_object_permissions(request, state)
+        flags = (state.is_favorited, state.is_in_shopping_cart,
+                 state.is_subscribed)
+        version = get_recipe_version(
+            state.updated_at,
+            state.author_id,
+            request.build_absolute_uri('/')
+        )
+        etag = quote_etag(
+            f'{version}-{"".join(str(int(flag)) for flag in flags)}'
+        )
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            key = get_recipe_key(recipe_id, version)
+            data = cache.get(key)
+            if data is None:
+                data = RecipeSerializerForRead(
+                    get_object_or_404(
+                        Recipe.objects.for_read(AnonymousUser()),
+                        pk=recipe_id
+                    ),
+                    context=self.get_serializer_context()
+                ).data
+                cache.set(key, data, RECIPE_TIMEOUT)
+            response = Response({
+                **data,
+                'is_favorited': state.is_favorited,
+                'is_in_shopping_cart': state.is_in_shopping_cart,
+                'author': {
+                    **data['author'],
+                    'is_subscribed': state.is_subscribed
+                },
+            })
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization', ))
+        return response
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     def perform_update(self, serializer):
         serializer.save()
 
-    @action(detail=True, methods=['get', 'delete'],
-            permission_classes=[permissions.IsAuthenticated])
-    def shopping_cart(self, request, pk=None):
-        user = self.request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
+    def toggle_relation(self, request, model, pk, add_error, delete_error):
+        """Adds or removes one (user, recipe) relation in one statement.
+
+        An empty result means the relation already existed (or did not), or
+        that the recipe does not exist; only then is the recipe looked up to
+        tell 400 from 404.
+        """
+        recipe_id = int(pk) if str(pk).isdigit() else 0
         if request.method == 'GET':
-            new, created = ShoppingCart.objects.get_or_create(
-                user=user,
-                recipe=recipe)
-            if not created:
+            if model.objects.add(request.user, (recipe_id,)):
+                recipe = Recipe.objects.get(pk=recipe_id)
                 return Response(
-                    {'errors': SHOPPING_CART_ADD_ERR_MSG},
-                    status=status.HTTP_400_BAD_REQUEST
+                    ShortRecipeSerializer(recipe).data,
+                    status=status.HTTP_201_CREATED
                 )
-            return Response(
-                ShortRecipeSerializer(recipe).data,
-                status=status.HTTP_201_CREATED
-            )
+            error = add_error
+        elif model.objects.remove(request.user, (recipe_id,)):
+            return Response(status=status.HTTP_204_NO_CONTENT)
         else:
-            if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-                recipe_to_delete = ShoppingCart.objects.get(
-                    user=user,
-                    recipe=recipe
-                )
-                recipe_to_delete.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response(
-                {'errors': SHOPPING_CART_DELETE_ERR_MSG},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            error = delete_error
+        get_object_or_404(Recipe, pk=recipe_id)
+        return Response(
+            {'errors': error},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-    @action(detail=True, methods=['get', 'delete'],
-            permission_classes=[permissions.IsAuthenticated])
-    def favorite(self, request, pk=None):
-        user = self.request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        if request.method == 'GET':
-            new, created = Favorite.objects.get_or_create(
-                user=user,
-                recipe=recipe)
-            if not created:
+    def toggle_relations(self, request, model, add_error, delete_error):
+        """Adds or removes relations to a list of recipes at once.
+
+        POST answers with the recipes actually added, DELETE with 204 if
+        anything was removed; 400 if nothing changed.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            added = model.objects.add(request.user, recipe_ids)
+            if added:
                 return Response(
-                    {'errors': FAVORITE_ADD_ERR_MSG},
-                    status=status.HTTP_400_BAD_REQUEST
+                    ShortRecipeSerializer(
+                        Recipe.objects.filter(pk__in=added).order_by('-id'),
+                        many=True
+                    ).data,
+                    status=status.HTTP_201_CREATED
                 )
-            return Response(
-                ShortRecipeSerializer(recipe).data,
-                status=status.HTTP_201_CREATED
-            )
+            error = add_error
+        elif model.objects.remove(request.user, recipe_ids):
+            return Response(status=status.HTTP_204_NO_CONTENT)
         else:
-            if ShoppingCart.objects.filter(user=user,
-                                           recipe=recipe).exists():
-                recipe_to_delete = Favorite.objects.get(
-                    user=user,
-                    recipe=recipe
-                )
-                recipe_to_delete.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            return Response(
-                {'errors': FAVORITE_DELETE_ERR_MSG},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            error = delete_error
+        return Response(
+            {'errors': error},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-    @action(detail=False, permission_classes=[permissions.IsAuthenticated])
-    def download_shopping_cart(self, request):
-        user = request.user
-        shopping_carts = user.shopping_carts.all()
-        recipes = []
-        for shopping_cart in shopping_carts:
-            recipes.append(shopping_cart.recipe)
-        ingredients_objects = dict()
-        for recipe in recipes:
-            ingredients = RecipeIngredients.objects.filter(recipe=recipe)
-            for ingredient in ingredients:
-                name = ingredient.ingredient.name
-                measurement_unit = ingredient.ingredient.measurement_unit
-                amount = ingredient.amount
-                if name not in ingredients_objects:
-                    ingredients_objects[name] = {
-                        'measurement_unit': measurement_unit,
-                        'amount': amount
-                    }
-                else:
-                    ingredients_objects[name]['amount'] += amount
-        shopping_list = ''
-        for key, value in ingredients_objects.items():
-            shopping_list += (f'{key}({value["measurement_unit"]}) - '
-                              f'{value["amount"]}\n')
-        shopping_list = ingredients_to_pdf(ingredients_objects)
-        return FileResponse(
-            shopping_list,
-            as_attachment=True,
-            filename='shopping_list.pdf'
+    @action(detail=True, methods=['get', 'delete'],
+            permission_classes=[permissions.IsAuthenticated])
+    def shopping_cart(self, request, pk=None):
+        return self.toggle_relation(
+            request,
+            ShoppingCart,
+            pk,
+            SHOPPING_CART_ADD_ERR_MSG,
+            SHOPPING_CART_DELETE_ERR_MSG
+        )
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart',
+            permission_classes=[permissions.IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        return self.toggle_relations(
+            request,
+            ShoppingCart,
+            SHOPPING_CART_ADD_ERR_MSG,
+            SHOPPING_CART_DELETE_ERR_MSG
         )
 
+    @action(detail=True, methods=['get', 'delete'],
+            permission_classes=[permissions.IsAuthenticated])
+    def favorite(self, request, pk=None):
+        return self.toggle_relation(
+            request,
+            Favorite,
+            pk,
+            FAVORITE_ADD_ERR_MSG,
+            FAVORITE_DELETE_ERR_MSG
+        )
 
-def ingredients_to_pdf(ingredients_dict):
-    buffer = io.BytesIO()
-    pdfmetrics.registerFont(TTFont('DejaVuSerif', 'DejaVuSerif.ttf'))
-    p = canvas.Canvas(buffer)
-    p.setFont('DejaVuSerif', 18)
-    p.drawString(100, 800, 'Список покупок:')
-    p.line(100, 785, 500, 785)
-    n = 750
-    i = 1
-    p.setFont('DejaVuSerif', 14)
-    for key, value in ingredients_dict.items():
-        p.drawString(
-            100,
-            n,
-            f'{i}. {key}({value["measurement_unit"]}) - {value["amount"]}'
+    @action(detail=False, methods=['post', 'delete'], url_path='favorite',
+            permission_classes=[permissions.IsAuthenticated])
+    def favorite_batch(self, request):
+        return self.toggle_relations(
+            request,
+            Favorite,
+            FAVORITE_ADD_ERR_MSG,
+            FAVORITE_DELETE_ERR_MSG
         )
-        n -= 20
-        i += 1
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    return buffer
+
+    @action(detail=False, permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
+    def download_shopping_cart(self, request):
+        """Streams the shopping list as txt (default), csv, json or pdf.
+
+        The format is picked by DRF content negotiation from the ``format``
+        query parameter or the Accept header. Rendered lists are cached per
+        cart version, and repeated downloads are answered with 304 when the
+        client sends a matching ETag.
+        """
+        user = request.user
+        renderer = request.accepted_renderer
+        version = get_cart_version(user.id)
+        etag = quote_etag(f'{version}-{renderer.format}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            key = get_shopping_list_key(user.id, version, renderer.format)
+            content = cache.get(key)
+            if content is None:
+                content = cache_stream(key, renderer.get_content(
+                    RecipeIngredients.objects.shopping_list(user)
+                ))
+            else:
+                content = (content,)
+            response = renderer.get_response(content)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
@@ -12,6 +12,8 @@ class UserAdmin(admin.ModelAdmin):
                     'email',
                     'last_name',
                     'password',
+                    'recipes_count',
+                    'followers_count',
                     )
     list_filter = ('email', 'username')
 
@@ -0,0 +1,62 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_KEY = 'auth_token:{digest}'
+
+
+def get_token_cache_key(key):
+    """Cache key of a token; the token itself never appears in the key."""
+    return TOKEN_KEY.format(
+        digest=hashlib.sha256(key.encode()).hexdigest()
+    )
+
+
+def invalidate_tokens(keys):
+    cache_keys = [get_token_cache_key(key) for key in keys]
+    transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that keeps token -> user lookups in the cache.
+
+    The USER_FIELDS of an active user are cached for TOKEN_CACHE_TIMEOUT
+    seconds, so a hit costs no query at all. The password hash never
+    leaves the database: it is deferred on the rebuilt user together with
+    the counters, which would go stale, and is loaded on first access (a
+    save() then writes only the loaded fields). Entries are dropped by the
+    signals in users.signals when a token is deleted (e.g. on logout) or
+    its user is saved (e.g. deactivated); a timeout of 0 disables the
+    cache.
+    """
+
+    USER_FIELDS = (
+        'id', 'email', 'username', 'first_name', 'last_name', 'is_active',
+        'is_staff', 'is_superuser', 'last_login', 'date_joined',
+    )
+
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+        cache_key = get_token_cache_key(key)
+        values = cache.get(cache_key)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                cache_key,
+                {field: getattr(user, field) for field in self.USER_FIELDS},
+                settings.TOKEN_CACHE_TIMEOUT
+            )
+            return (user, token)
+        model = get_user_model()
+        # from_db() expects the loaded values in the model's field order.
+        fields = [field.attname for field in model._meta.concrete_fields
+                  if field.attname in values]
+        user = model.from_db(
+            DEFAULT_DB_ALIAS, fields, [values[field] for field in fields]
+        )
+        return (user, self.get_model()(key=key, user=user))
@@ -1,12 +1,64 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
+READ_COLUMNS = ('email', 'username', 'first_name', 'last_name',
+                'recipes_count')
+
+
+class UserQuerySet(models.QuerySet):
+    def with_is_subscribed(self, user):
+        """Annotates users with whether the given user follows them."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_subscribed=models.Value(
+                    False, output_field=models.BooleanField()
+                )
+            )
+        return self.annotate(
+            is_subscribed=models.Exists(Follow.objects.filter(
+                user=user,
+                following=models.OuterRef('pk')
+            ))
+        )
+
+    def for_read(self, user, fields=None):
+        """Fetches what the given serializer fields of users need.
+
+        ``fields`` are the names of the fields to be rendered (see
+        foodgram.sparse), None for all of them.
+        """
+        queryset = self
+        if fields is not None:
+            queryset = queryset.only(
+                'id',
+                *(column for column in READ_COLUMNS if column in fields)
+            )
+        if fields is not None and 'is_subscribed' not in fields:
+            return queryset
+        return queryset.with_is_subscribed(user)
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
 
 class User(AbstractUser):
     email = models.EmailField('E-mail', max_length=50, unique=True)
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
 
+    objects = CustomUserManager()
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -1,10 +1,13 @@
 from djoser.serializers import UserSerializer
+from foodgram.metrics import TimedSerializerMixin
+from foodgram.sparse import SparseFieldsetMixin
 from rest_framework import serializers
 
 from .models import Follow, User
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(SparseFieldsetMixin, TimedSerializerMixin,
+                           UserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -13,6 +16,8 @@ class CustomUserSerializer(UserSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         if user.is_anonymous:
             return False
@@ -0,0 +1,44 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens
+from .models import Follow, User
+
+
+def change_counter(model, pks, field, delta):
+    """Atomically shifts a denormalized counter column of rows by delta.
+
+    The value is clamped at zero so that a counter which has drifted below
+    the real count cannot violate the column's positive constraint.
+    """
+    model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, (instance.following_id,), 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(sender, instance, **kwargs):
+    change_counter(User, (instance.following_id,), 'followers_count',
+                   -1)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_tokens((instance.key,))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_tokens(Token.objects.filter(
+            user_id=instance.pk
+        ).values_list('key', flat=True))
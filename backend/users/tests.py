@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from recipes.tests import create_recipes, create_user
+from rest_framework.test import APIClient
+
+from .authentication import CachedTokenAuthentication, get_token_cache_key
+from .models import Follow, User
+
+
+@override_settings(TOKEN_CACHE_TIMEOUT=300)
+class CachedTokenAuthenticationTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            first_name='reader',
+            last_name='reader',
+            password='secret-password'
+        )
+        self.client = APIClient()
+        response = self.client.post('/api/auth/token/login/', {
+            'email': 'reader@example.com',
+            'password': 'secret-password'
+        })
+        self.key = response.data['auth_token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+        # The first request puts the token into the cache.
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+    def test_cache_hit_without_queries(self):
+        self.assertNotIn(
+            'password', cache.get(get_token_cache_key(self.key))
+        )
+        with self.assertNumQueries(0):
+            user, token = (
+                CachedTokenAuthentication().authenticate_credentials(self.key)
+            )
+        self.assertEqual(
+            (user.pk, user.email), (self.user.pk, self.user.email)
+        )
+        self.assertEqual(token.key, self.key)
+        # The deferred password is loaded, not blanked, before a save.
+        user.first_name = 'renamed'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'renamed')
+        self.assertTrue(self.user.check_password('secret-password'))
+
+    def test_cached_token_rejected_after_logout(self):
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_cached_token_rejected_for_inactive_user(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+
+@override_settings(FEED_FANOUT_LIMIT=2)
+class FeedTests(TestCase):
+    def setUp(self):
+        self.user = create_user('reader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        author, popular_author = create_user('author'), create_user('star')
+        for follower in (self.user, create_user('fan')):
+            Follow.objects.create(user=follower, following=popular_author)
+        Follow.objects.create(user=self.user, following=author)
+        create_recipes(create_user('stranger'), 2, (), ())
+        self.recipe_ids = sorted((
+            recipe.pk
+            for index in range(3)
+            for recipe in (create_recipes(author, 1, (), ())
+                           + create_recipes(popular_author, 1, (), ()))
+        ), reverse=True)
+
+    def test_pages(self):
+        for limit in (2, 4):
+            with self.subTest(limit=limit):
+                ids = []
+                url = f'/api/users/feed/?limit={limit}'
+                while url:
+                    # Popular authors, timeline, their recipes, then the
+                    # page: recipes, authors, tags, ingredients.
+                    with self.assertNumQueries(7):
+                        response = self.client.get(url)
+                    ids += [
+                        recipe['id'] for recipe in response.data['results']
+                    ]
+                    url = response.data['next']
+                self.assertEqual(ids, self.recipe_ids)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/users/feed/?cursor=abc')
+        self.assertEqual(response.status_code, 404)
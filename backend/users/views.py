@@ -1,33 +1,81 @@
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
+from foodgram.db import ReplicaReadMixin
+from foodgram.sparse import SparseFieldsetViewMixin
 from rest_framework import exceptions, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from .models import Follow, User
-from recipes.serializers import SubscribeUserSerializer
+from recipes.models import Recipe
+from recipes.pagination import FeedPagination
+from recipes.serializers import (RecipeSerializerForRead,
+                                 SubscribeUserSerializer)
 
 SUBSCRIBE_ERR_MSG = 'Нельзя подписаться дважды или на самого себя!'
 UNSUBSCRIBE_ERR_MSG = 'Вы не были подписаны!'
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(ReplicaReadMixin, SparseFieldsetViewMixin,
+                        UserViewSet):
+    replica_actions = ('list', 'feed')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return queryset.for_read(self.request.user, self.sparse_fields)
+        return queryset
+
     @action(detail=False, methods=['get', ],
             permission_classes=[permissions.IsAuthenticated],
             serializer_class=SubscribeUserSerializer)
     def subscriptions(self, request):
-        follower_objects = request.user.follower.all()
-        followers = []
-        for object in follower_objects:
-            followers.append(object.following)
-        page = self.paginate_queryset(followers)
+        limit = request.query_params.get('recipes_limit')
+        limit = int(limit) if limit and limit.isdigit() else None
+        fields = self.sparse_fields
+        followings = User.objects.filter(
+            following__user=request.user
+        ).for_read(request.user, fields).order_by('following__id')
+        if fields is None or 'recipes' in fields:
+            recipes = Recipe.objects.latest_per_author(limit)
+            if fields is not None and 'recipes' not in self.expand:
+                recipes = recipes.only('id', 'author')
+            followings = followings.prefetch_related(Prefetch(
+                'recipes',
+                queryset=recipes,
+                to_attr='recipes_preview'
+            ))
+        page = self.paginate_queryset(followings)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(followers, many=True)
+        serializer = self.get_serializer(followings, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get', ],
+            permission_classes=[permissions.IsAuthenticated],
+            serializer_class=RecipeSerializerForRead,
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Recipes of the followed authors, newest first."""
+        ids = self.paginator.paginate_ids(
+            lambda before, limit: Recipe.objects.feed_ids(
+                request.user,
+                before,
+                limit
+            ),
+            request
+        )
+        recipes = Recipe.objects.filter(pk__in=ids).for_read(
+            request.user,
+            self.sparse_fields,
+            self.expand
+        ).order_by('-id')
+        serializer = self.get_serializer(recipes, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['get', 'delete'],
             permission_classes=[permissions.IsAuthenticated],
             serializer_class=SubscribeUserSerializer)